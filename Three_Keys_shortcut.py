@@ -2,6 +2,12 @@ import bpy
 import blf
 from bpy.props import *
 import math
+import time
+import json
+import os
+from array import array
+from types import MappingProxyType, SimpleNamespace
+from bpy_extras.io_utils import ExportHelper, ImportHelper
 
 from collections.abc import Callable
 from typing import Union, Any, Optional, Literal
@@ -34,6 +40,45 @@ bl_info = {
 
 PIXEL_SIZE = 1.0
 
+# キー入力を整数で表すときの補助キーのビット. 整数の下位4ビットが補助キー、それより上がキーの種類
+MOD_SHIFT = 1
+MOD_CTRL = 2
+MOD_ALT = 4
+MOD_OSKEY = 8
+MOD_BITS = 4
+MOD_MASK = (1 << MOD_BITS) - 1
+
+# チョードを使えるエディター: (space_type, キーマップ名, 表示名, Space クラス名)
+CHORD_SPACES = [
+    ('VIEW_3D', "3D View", "3D Viewport", "SpaceView3D"),
+    ('NODE_EDITOR', "Node Editor", "Node Editor", "SpaceNodeEditor"),
+    ('IMAGE_EDITOR', "Image", "Image Editor", "SpaceImageEditor"),
+]
+
+# チョードを限定できるモード (context.mode の値). 'ANY' はすべてのモードで有効
+CHORD_MODES = [
+    'ANY', 'OBJECT', 'EDIT_MESH', 'EDIT_CURVE', 'EDIT_SURFACE', 'EDIT_TEXT', 'EDIT_ARMATURE',
+    'EDIT_METABALL', 'EDIT_LATTICE', 'POSE', 'SCULPT', 'PAINT_WEIGHT', 'PAINT_VERTEX',
+    'PAINT_TEXTURE', 'PARTICLE',
+]
+
+# プロファイルが1つも無いときに作成する、初期設定のプロファイル名
+DEFAULT_PROFILE = "Default"
+
+# オペレーターの実行コンテキスト
+EXEC_CONTEXT_NAMES = [
+    'INVOKE_DEFAULT', 'INVOKE_REGION_WIN',
+    'INVOKE_REGION_CHANNELS', 'INVOKE_REGION_PREVIEW',
+    'INVOKE_AREA', 'INVOKE_SCREEN', 'EXEC_DEFAULT',
+    'EXEC_REGION_WIN', 'EXEC_REGION_CHANNELS',
+    'EXEC_REGION_PREVIEW', 'EXEC_AREA', 'EXEC_SCREEN'
+]
+
+# {Event.type の識別子: その enum の値}
+EVENT_TYPE_IDS: dict[str, int] = {
+    item.identifier: item.value for item in bpy.types.Event.bl_rna.properties['type'].enum_items
+}
+
 
 # ----- draw helper ---------------
 def indented_layout( context: Context,
@@ -256,21 +301,102 @@ def key_to_string(item: KeyMapItem) -> str:
     return text + item.type
 
 
-def event_to_string(event: Event) -> str:
-    """	Event のキー情報から '[Shift] W' のような文字列を生成する
+def key_to_code(item: KeyMapItem) -> int:
+    """	KeyMapItem のキー設定を、キーの種類と補助キーのビットをまとめた整数に変換する
 
-    item (bpy.types.Event) : Event
+    item (bpy.types.KeyMapItem) : KeyMapItem
     """
-    text = ""	
-    if event.shift:
-        text = "[Shift] " 
-    if event.ctrl:
-        text += "[Ctrl] "
-    if event.alt:
-        text += "[Alt] "
-    if event.oskey:
-        text += "[Cmd] "
-    return text + event.type
+    mods = 0
+    if item.shift_ui or item.shift == 1:
+        mods |= MOD_SHIFT
+    if item.ctrl_ui or item.ctrl == 1:
+        mods |= MOD_CTRL
+    if item.alt_ui or item.alt == 1:
+        mods |= MOD_ALT
+    if item.oskey_ui or item.oskey == 1:
+        mods |= MOD_OSKEY
+    return EVENT_TYPE_IDS.get(item.type, 0) << MOD_BITS | mods
+
+
+def event_to_code(event: Event) -> int:
+    """	Event のキー情報を、キーの種類と補助キーのビットをまとめた整数に変換する
+
+    event (bpy.types.Event) : Event
+    """
+    return (EVENT_TYPE_IDS.get(event.type, 0) << MOD_BITS
+            | event.shift | event.ctrl << 1 | event.alt << 2 | event.oskey << 3)
+
+
+def chord_codes(base_mods: int, item: KeyMapItem) -> list[int]:
+    """	ChordIndex で使う整数のキーの一覧を生成する
+    'any' が有効なものは、補助キーのすべての組み合わせに展開される
+
+    base_mods (int) : モーダルモード移行キーの補助キーのビット
+    item (bpy.types.KeyMapItem) : KeyMapItem
+    """
+    code = key_to_code(item) | base_mods
+    if item.any:
+        type_code = code & ~MOD_MASK
+        return [type_code | mods for mods in range(MOD_MASK + 1)]
+    return [code]
+
+
+def freeze_id_value(value: Any) -> Any:
+    """	ID プロパティの値を、ハッシュ可能な値に変換する
+
+    value (Any) : ID プロパティの値
+    """
+    if hasattr(value, "to_dict"):
+        value = value.to_dict()
+    elif hasattr(value, "to_list"):
+        value = value.to_list()
+    if isinstance(value, dict):
+        return tuple(sorted((k, freeze_id_value(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze_id_value(v) for v in value)
+    return value
+
+
+def properties_checksum(properties: Any) -> int:
+    """	KeyMapItem.properties の、明示的に設定された値 (ID プロパティ) のハッシュ値を返す
+
+    properties (bpy.types.OperatorProperties) : KeyMapItem.properties
+    """
+    if properties is None:
+        return 0
+    return hash(tuple(sorted((k, freeze_id_value(v)) for k, v in properties.items())))
+
+
+def properties_to_kwargs(properties: Any) -> MappingProxyType:
+    """	KeyMapItem.properties の値から、オペレーターに渡すキーワード引数の読み取り専用の辞書を生成する
+    配列は tuple に、集合は新しい set に変換し、元の RNA データへの参照を残さない
+
+    properties (bpy.types.OperatorProperties) : KeyMapItem.properties
+    """
+    kwargs = {}
+    if properties is None:
+        return MappingProxyType(kwargs)
+    for prop in properties.bl_rna.properties:
+        name = prop.identifier
+        if name == "rna_type":
+            continue
+        value = getattr(properties, name)
+        if isinstance(value, set):
+            value = set(value)
+        elif getattr(prop, "array_length", 0) > 0:
+            value = tuple(value)
+        kwargs[name] = value
+    return MappingProxyType(kwargs)
+
+
+def ensure_profile(prefs: Any, name: str) -> None:
+    """ 名前が name の ChordProfile が無ければ追加する
+
+    prefs (AddonPrefs) : アドオン設定
+    name (str) : プロファイル名
+    """
+    if prefs.profiles.find(name) < 0:
+        prefs.profiles.add().name = name
 
 
 def reset_groups(context):
@@ -280,6 +406,9 @@ def reset_groups(context):
     """
     prefs = context.preferences.addons[__name__].preferences
     prefs.op_items.clear()
+    prefs.profiles.clear()
+    ensure_profile(prefs, DEFAULT_PROFILE)
+    prefs.active_profile = DEFAULT_PROFILE
 
     keymap = context.window_manager.keyconfigs.addon.keymaps.find(__name__)
     if keymap:
@@ -295,33 +424,1340 @@ def reset_groups(context):
         keyitem.properties.value = angle
         keyitem.properties.orient_axis = ax
         op_item.exec_context = 'EXEC_DEFAULT'
+    chord_index.mark_dirty()
+
+
+# ----- import / export -------------
+# 書き出すファイルの形式名とその版. 1行目のヘッダーに記録される
+EXPORT_FORMAT = "three_keys_shortcut"
+EXPORT_VERSION = 1
+
+SPACE_TYPES = {space for space, _km, _label, _cls in CHORD_SPACES}
+
+KEY_VALUES = set(KeyMapItem.bl_rna.properties['value'].enum_items.keys())
+EXEC_CONTEXTS = set(EXEC_CONTEXT_NAMES)
+
+
+def key_to_record(item: KeyMapItem) -> dict[str, Any]:
+    """	KeyMapItem のキー設定を JSON に書き出せる辞書にする
+
+    item (bpy.types.KeyMapItem) : KeyMapItem
+    """
+    return {
+        "type": item.type, "value": item.value, "any": item.any,
+        "shift": item.shift, "ctrl": item.ctrl, "alt": item.alt, "oskey": item.oskey,
+        "key_modifier": item.key_modifier, "repeat": item.repeat, "active": item.active,
+    }
+
+
+def properties_to_record(properties: Any) -> dict[str, Any]:
+    """	KeyMapItem.properties の値を JSON に書き出せる辞書にする. 書き出せない値 (Pointer など) は除く
+
+    properties (bpy.types.OperatorProperties) : KeyMapItem.properties
+    """
+    record = {}
+    for name, value in properties_to_kwargs(properties).items():
+        if isinstance(value, set):
+            value = sorted(value)
+        elif isinstance(value, tuple):
+            value = list(value)
+        if isinstance(value, (bool, int, float, str, list)):
+            record[name] = value
+    return record
+
+
+def item_to_record(item: "OperatorItem", key_items: dict[int, KeyMapItem]) -> Optional[dict[str, Any]]:
+    """	OperatorItem とその KeyMapItem を JSON に書き出せる辞書にする. KeyMapItem が無い場合は None
+
+    item (OperatorItem) : OperatorItem
+    key_items (dict[int, KeyMapItem]) : {id: KeyMapItem}
+    """
+    kmi = key_items.get(item.idx)
+    prefix = [key_items.get(step.idx) for step in item.prefix]
+    macro = [(key_items.get(step.idx), step.exec_context) for step in item.macro]
+    if kmi is None or None in prefix or any(k is None for k, _ in macro):
+        return None
+    return {
+        "idname": kmi.idname,
+        "exec_context": item.exec_context,
+        "timeout": item.timeout,
+        "space_type": item.space_type,
+        "mode": item.mode,
+        "profile": item.profile,
+        "key": key_to_record(kmi),
+        "prefix": [key_to_record(k) for k in prefix],
+        "properties": properties_to_record(kmi.properties),
+        "macro": [
+            {"idname": k.idname, "exec_context": ctx, "properties": properties_to_record(k.properties)}
+            for k, ctx in macro
+        ],
+    }
+
+
+def validate_key_record(record: Any) -> list[str]:
+    """	キー設定の辞書の誤りを、メッセージのリストとして返す
+
+    record (Any) : key_to_record() 形式の辞書
+    """
+    if not isinstance(record, dict):
+        return ["key must be an object"]
+    errors = []
+    if record.get("type") not in EVENT_TYPE_IDS:
+        errors.append(f"unknown key type: {record.get('type')!r}")
+    if record.get("value", "PRESS") not in KEY_VALUES:
+        errors.append(f"unknown key value: {record.get('value')!r}")
+    key_modifier = record.get("key_modifier", "NONE")
+    if key_modifier != "NONE" and key_modifier not in EVENT_TYPE_IDS:
+        errors.append(f"unknown key modifier: {key_modifier!r}")
+    for mod in ("shift", "ctrl", "alt", "oskey"):
+        if record.get(mod, 0) not in (-1, 0, 1):
+            errors.append(f"{mod} must be -1, 0 or 1")
+    for flag in ("any", "repeat", "active"):
+        if not isinstance(record.get(flag, False), bool):
+            errors.append(f"{flag} must be true or false")
+    return errors
+
+
+def is_property_value(value: Any) -> bool:
+    """	properties_to_record() が書き出す値 (JSON のスカラー、またはそのリスト) か
+
+    value (Any) : properties の値
+    """
+    if isinstance(value, list):
+        return all(is_property_value(v) for v in value)
+    return value is None or isinstance(value, (bool, int, float, str))
+
+
+def validate_properties_record(record: Any, label: str) -> list[str]:
+    """	properties_to_record() 形式の辞書の誤りを、メッセージのリストとして返す
+
+    record (Any) : properties_to_record() 形式の辞書
+    label (str) : メッセージに使う項目名
+    """
+    if not isinstance(record, dict):
+        return [f"{label} must be an object"]
+    return [
+        f"{label}.{name}: unsupported value {value!r}"
+        for name, value in record.items() if not is_property_value(value)
+    ]
+
+
+def validate_item_record(record: Any) -> list[str]:
+    """	item_to_record() 形式の辞書の誤りを、メッセージのリストとして返す
+
+    record (Any) : item_to_record() 形式の辞書
+    """
+    if not isinstance(record, dict):
+        return ["item must be an object"]
+    errors = []
+    idname = record.get("idname", "")
+    if not isinstance(idname, str) or (idname != "" and len(idname.split(".")) != 2):
+        errors.append(f"invalid idname: {idname!r}")
+    if record.get("exec_context", "INVOKE_DEFAULT") not in EXEC_CONTEXTS:
+        errors.append(f"unknown exec_context: {record.get('exec_context')!r}")
+    if record.get("space_type", "VIEW_3D") not in SPACE_TYPES:
+        errors.append(f"unknown space_type: {record.get('space_type')!r}")
+    if record.get("mode", "ANY") not in CHORD_MODES:
+        errors.append(f"unknown mode: {record.get('mode')!r}")
+    profile = record.get("profile", DEFAULT_PROFILE)
+    if not isinstance(profile, str) or profile == "":
+        errors.append(f"invalid profile: {profile!r}")
+    timeout = record.get("timeout", 0.0)
+    if isinstance(timeout, bool) or not isinstance(timeout, (int, float)) \
+            or not math.isfinite(timeout) or timeout < 0:
+        errors.append(f"invalid timeout: {timeout!r}")
+    errors += validate_properties_record(record.get("properties", {}), "properties")
+    prefix = record.get("prefix", [])
+    if not isinstance(prefix, list):
+        errors.append("prefix must be a list")
+        prefix = []
+    for key in [record.get("key")] + prefix:
+        errors += validate_key_record(key)
+    macro = record.get("macro", [])
+    if not isinstance(macro, list):
+        errors.append("macro must be a list")
+        macro = []
+    for step in macro:
+        if not isinstance(step, dict):
+            errors.append("macro step must be an object")
+            continue
+        idname = step.get("idname", "")
+        if not isinstance(idname, str) or (idname != "" and len(idname.split(".")) != 2):
+            errors.append(f"invalid macro idname: {idname!r}")
+        if step.get("exec_context", "EXEC_DEFAULT") not in EXEC_CONTEXTS:
+            errors.append(f"unknown macro exec_context: {step.get('exec_context')!r}")
+        errors += validate_properties_record(step.get("properties", {}), "macro properties")
+    return errors
+
+
+def new_key_item(key_items: Any, idname: str, record: dict[str, Any]) -> KeyMapItem:
+    """	キー設定の辞書から KeyMapItem を作成する
+
+    key_items (bpy.types.KeyMapItems) : KeyMap.keymap_items
+    idname (str) : オペレーターの idname
+    record (dict[str, Any]) : key_to_record() 形式の辞書
+    """
+    kmi = key_items.new(
+        idname, record["type"], record.get("value", "PRESS"), any=record.get("any", False),
+        shift=record.get("shift", 0), ctrl=record.get("ctrl", 0), alt=record.get("alt", 0),
+        oskey=record.get("oskey", 0), key_modifier=record.get("key_modifier", "NONE"),
+        repeat=record.get("repeat", False)
+    )
+    kmi.active = record.get("active", True)
+    return kmi
+
+
+def set_properties(properties: Any, record: dict[str, Any]) -> None:
+    """	properties_to_record() 形式の辞書の値を KeyMapItem.properties に設定する. 設定できない値は無視する
+
+    properties (bpy.types.OperatorProperties) : KeyMapItem.properties
+    record (dict[str, Any]) : properties_to_record() 形式の辞書
+    """
+    if properties is None:
+        return
+    rna_props = properties.bl_rna.properties
+    for name, value in record.items():
+        prop = rna_props.get(name)
+        if prop is None:
+            continue
+        if getattr(prop, "is_enum_flag", False):
+            value = set(value)
+        try:
+            setattr(properties, name, value)
+        except (AttributeError, TypeError, ValueError):
+            pass
+
+
+def create_items(prefs: Any, key_items: Any, records: list[dict[str, Any]]) -> None:
+    """	検証済みの辞書のリストから OperatorItem と KeyMapItem をまとめて作成する
+    記録されたプロファイルが無ければ追加する. chord_index の再構築は最後に1度だけ予約する
+
+    prefs (AddonPrefs) : アドオン設定
+    key_items (bpy.types.KeyMapItems) : KeyMap.keymap_items
+    records (list[dict[str, Any]]) : item_to_record() 形式の辞書のリスト
+    """
+    op_items = prefs.op_items
+    for record in records:
+        idname = record.get("idname", "")
+        kmi = new_key_item(key_items, idname, record["key"])
+        set_properties(kmi.properties, record.get("properties", {}))
+        op_item = op_items.add()
+        op_item.idx = kmi.id
+        op_item.exec_context = record.get("exec_context", "INVOKE_DEFAULT")
+        op_item.timeout = record.get("timeout", 0.0)
+        op_item.space_type = record.get("space_type", "VIEW_3D")
+        op_item.mode = record.get("mode", "ANY")
+        op_item.profile = record.get("profile", DEFAULT_PROFILE)
+        ensure_profile(prefs, op_item.profile)
+        for key in record.get("prefix", []):
+            step = op_item.prefix.add()
+            step.idx = new_key_item(key_items, "", key).id
+        for data in record.get("macro", []):
+            macro_kmi = key_items.new(data.get("idname", ""), 'NONE', "PRESS")
+            set_properties(macro_kmi.properties, data.get("properties", {}))
+            step = op_item.macro.add()
+            step.idx = macro_kmi.id
+            step.exec_context = data.get("exec_context", "EXEC_DEFAULT")
+    chord_index.mark_dirty()
+
+
+def write_items(f: Any, prefs: Any, key_items: dict[int, KeyMapItem],
+                extra_header: Optional[dict[str, Any]] = None) -> int:
+    """	OperatorItem を JSON Lines 形式で1件ずつファイルに書き出し、書き出した件数を返す
+    1行目はヘッダー、2行目以降が item_to_record() 形式の辞書になる
+
+    f (TextIO) : 書き込み先のファイル
+    prefs (AddonPrefs) : アドオン設定
+    key_items (dict[int, KeyMapItem]) : {id: KeyMapItem}
+    extra_header (dict[str, Any] | None) : ヘッダーに追加する内容. デフォルト None
+    """
+    header = {
+        "format": EXPORT_FORMAT, "version": EXPORT_VERSION,
+        "addon_version": list(bl_info["version"]), "blender_version": list(bpy.app.version),
+    }
+    if extra_header:
+        header.update(extra_header)
+    f.write(json.dumps(header, separators=(",", ":")) + "\n")
+    count = 0
+    for item in prefs.op_items:
+        record = item_to_record(item, key_items)
+        if record is None:
+            continue
+        f.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n")
+        count += 1
+    return count
+
+
+def read_items(f: Any) -> tuple[dict[str, Any], list[dict[str, Any]], list[str]]:
+    """	write_items() で書き出したファイルを読み込み、(ヘッダー, 辞書のリスト, エラーのリスト) を返す
+    すべての行を検証し、エラーは行番号付きのメッセージとして返す
+
+    f (TextIO) : 読み込むファイル
+    """
+    header: dict[str, Any] = {}
+    records = []
+    errors = []
+    for lineno, line in enumerate(f, start=1):
+        line = line.strip()
+        if line == "":
+            continue
+        try:
+            data = json.loads(line)
+        except ValueError as e:
+            errors.append(f"line {lineno}: {e}")
+            continue
+        if lineno == 1:
+            if not isinstance(data, dict) or data.get("format") != EXPORT_FORMAT:
+                errors.append(f"line {lineno}: not a {EXPORT_FORMAT} file")
+                break
+            header = data
+            continue
+        errors += [f"line {lineno}: {msg}" for msg in validate_item_record(data)]
+        records.append(data)
+    return header, records, errors
+
+
+# ----- snapshot --------------------
+# 起動時の復元にかかった時間などの記録. {"source": "snapshot" | "defaults", "items": int, "seconds": float}
+startup_stats: dict[str, Any] = {}
+
+# 設定の変更から、スナップショットを保存するまでの待ち時間 (秒)
+SNAPSHOT_DELAY = 2.0
+
+
+def snapshot_path() -> str:
+    """ スナップショットのファイルのパスを返す
+    """
+    directory = bpy.utils.user_resource('CONFIG', path="three_keys_shortcut", create=True)
+    return os.path.join(directory, "snapshot.jsonl")
+
+
+def save_snapshot() -> None:
+    """ 現在の OperatorItem とモーダルモード移行キーの設定をスナップショットとして保存する
+    bpy.app.timers から呼ばれるため、常に None を返す
+    """
+    context = bpy.context
+    addon = context.preferences.addons.get(__name__)
+    kc = context.window_manager.keyconfigs.addon
+    keymap = kc.keymaps.find(__name__) if kc else None
+    if addon is None or keymap is None or not addon_keymaps:
+        return None
+    key_items = {kmi.id: kmi for kmi in keymap.keymap_items}
+    path = snapshot_path()
+    try:
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            write_items(f, addon.preferences, key_items, {
+                "trigger": key_to_record(addon_keymaps[0][1]),
+                "profiles": [profile.name for profile in addon.preferences.profiles],
+                "active_profile": addon.preferences.active_profile,
+            })
+        os.replace(path + ".tmp", path)
+    except OSError as e:
+        print(f"{__name__}: failed to save the snapshot: {e}")
+    return None
+
+
+def schedule_snapshot() -> None:
+    """ SNAPSHOT_DELAY 秒後にスナップショットを保存する. 連続した変更は1回の保存にまとめられる
+    """
+    if not bpy.app.timers.is_registered(save_snapshot):
+        bpy.app.timers.register(save_snapshot, first_interval=SNAPSHOT_DELAY, persistent=True)
+
+
+def restore_snapshot(context: Context) -> bool:
+    """ スナップショットから OperatorItem とモーダルモード移行キーの設定をまとめて復元する
+    ファイルが無い、アドオンまたは Blender のバージョンが異なる、内容に誤りがある場合は何もせず False を返す
+
+    context (bpy.types.Context) : context
+    """
+    path = snapshot_path()
+    if not os.path.exists(path):
+        return False
+    try:
+        with open(path, encoding="utf-8") as f:
+            header, records, errors = read_items(f)
+    except OSError:
+        return False
+    if errors:
+        return False
+    if header.get("addon_version") != list(bl_info["version"]) \
+            or header.get("blender_version") != list(bpy.app.version):
+        return False
+
+    prefs = context.preferences.addons[__name__].preferences
+    prefs.op_items.clear()
+    prefs.profiles.clear()
+    keymaps = context.window_manager.keyconfigs.addon.keymaps
+    keymap = keymaps.find(__name__)
+    if keymap:
+        keymaps.remove(keymap)
+    keymap = keymaps.new(__name__)
+    # OperatorItem を持たないプロファイルも、保存時の順番のまま復元する
+    for name in header.get("profiles", []):
+        if isinstance(name, str) and name != "":
+            ensure_profile(prefs, name)
+    create_items(prefs, keymap.keymap_items, records)
+    ensure_profile(prefs, DEFAULT_PROFILE)
+    active = header.get("active_profile", DEFAULT_PROFILE)
+    prefs.active_profile = active if prefs.profiles.find(active) >= 0 else DEFAULT_PROFILE
+
+    trigger = header.get("trigger")
+    if addon_keymaps and isinstance(trigger, dict) and not validate_key_record(trigger):
+        kmi = addon_keymaps[0][1]
+        kmi.type = trigger["type"]
+        kmi.value = trigger.get("value", "PRESS")
+        for prop in ("any", "shift", "ctrl", "alt", "oskey", "key_modifier", "repeat"):
+            if prop in trigger:
+                setattr(kmi, prop, trigger[prop])
+    return True
+
+
+def restore_or_reset(context: Context) -> None:
+    """ スナップショットから設定を復元し、できない場合は初期設定に戻す. かかった時間を startup_stats に記録する
+
+    context (bpy.types.Context) : context
+    """
+    t_start = time.perf_counter()
+    source = "snapshot" if restore_snapshot(context) else "defaults"
+    if source == "defaults":
+        reset_groups(context)
+    if bpy.app.timers.is_registered(save_snapshot):
+        bpy.app.timers.unregister(save_snapshot)
+    prefs = context.preferences.addons[__name__].preferences
+    startup_stats.update({
+        "source": source, "items": len(prefs.op_items), "seconds": time.perf_counter() - t_start
+    })
+    print(f"{__name__}: restored {startup_stats['items']} items from {source}"
+          f" in {startup_stats['seconds'] * 1000:.1f} ms")
+
+
+# ----- chord index -----------------
+class ChordNode:
+    """ キー入力の列を表すトライ木の節
+
+    children (dict[int, ChordNode]): {key_to_code() 形式の整数: 次の節}
+    entry (dict[str, Any] | None): この節で確定するオペレーターの情報. 途中の節では None
+        {"key_item": KeyMapItem, "exec_context": str, "kwargs": (str, int, MappingProxyType) | None,
+         "name": str, "item_idx": int, "macro": list[dict[str, Any]]}
+        macro の各要素は {"key_item": KeyMapItem, "exec_context": str, "kwargs": ...} の形式
+    label (str): この節に至るキー入力の表示用の文字列
+    timeout (float | None): この節で次の入力を待つ秒数. 0 のときは無制限、None は未設定
+    lines (list[tuple[str, dict | None]] | None): 次に入力できるキーとオペレーター名の表示用の文字列と、
+        その行で確定する entry (途中の節の行は None) の組. 初回の menu_lines() で作られる
+    event_types (frozenset[str]): 根のみ. トライ木のどこかで使われている Event.type の集合
+    """
+    __slots__ = ("children", "entry", "label", "timeout", "lines", "event_types")
+
+    def __init__(self, label: str = ""):
+        self.children: dict[int, ChordNode] = {}
+        self.entry: Optional[dict[str, Any]] = None
+        self.label = label
+        self.timeout: Optional[float] = None
+        self.lines: Optional[list[tuple[str, Optional[dict[str, Any]]]]] = None
+        self.event_types: frozenset[str] = frozenset()
+
+    def menu_lines(self) -> list[tuple[str, Optional[dict[str, Any]]]]:
+        """ 次に入力できるキーとオペレーター名の一覧を (表示用の文字列, entry | None) の形で返す
+        'any' で展開された重複は1つにまとめる
+        """
+        if self.lines is None:
+            lines = []
+            seen = set()
+            for child in self.children.values():
+                if id(child) in seen:
+                    continue
+                seen.add(id(child))
+                if child.entry is not None:
+                    lines.append((f"{child.label}:  {child.entry['name']}", child.entry))
+                if child.children:
+                    lines.append((f"{child.label}  →  ...", None))
+            self.lines = lines
+        return self.lines
+
+    def merge_timeout(self, timeout: float) -> None:
+        """ この節を通るキー入力の列のタイムアウトを反映する. 無制限のものが1つでもあれば無制限になる
+
+        timeout (float): OperatorItem.timeout
+        """
+        if self.timeout is None:
+            self.timeout = timeout
+        elif self.timeout == 0 or timeout == 0:
+            self.timeout = 0.0
+        else:
+            self.timeout = max(self.timeout, timeout)
+
+
+class ChordIndex:
+    """ キー入力の列からオペレーターを引くトライ木を、invoke をまたいで保持する
+    トライ木はプロファイルごとに作成しておき、プロファイルの切り替えは tables の参照の差し替えだけで行う
+
+    profiles (dict[str, dict[tuple[str, str], ChordNode]]): {プロファイル名: そのプロファイルの tables}
+    timeouts (dict[str, bool]): {プロファイル名: タイムアウトが設定された節が存在するか}
+    active_profile (str): 使用中のプロファイル名
+    tables (dict[tuple[str, str], ChordNode]): 使用中のプロファイルの {(space_type, mode): トライ木の根}
+        根はモーダルモード移行キーの直後の状態に対応する. mode が 'ANY' の OperatorItem は
+        同じエディターのすべての表に含まれ、(space_type, 'ANY') の表は他のモードで使われる
+    has_timeout (bool): 使用中のプロファイルに、タイムアウトが設定された節が存在するか
+    positions (dict[int, int]): {OperatorItem.idx: AddonPrefs.op_items での位置}
+    conflicts (dict[int, set[int]]): {OperatorItem.idx: 同じ表で同じキー入力の列を持つ他の OperatorItem.idx}
+    dirty (bool): True のとき、次の ensure() でトライ木を作り直す
+    drawn_checksums (tuple | None): 設定画面で前回表示した KeyMapItem の ((id, properties_checksum()), ...)
+    """
+    def __init__(self):
+        self.profiles: dict[str, dict[tuple[str, str], ChordNode]] = {}
+        self.timeouts: dict[str, bool] = {}
+        self.active_profile = DEFAULT_PROFILE
+        self.tables: dict[tuple[str, str], ChordNode] = {}
+        self.has_timeout = False
+        self.positions: dict[int, int] = {}
+        self.conflicts: dict[int, set[int]] = {}
+        self.dirty = True
+        self.drawn_checksums: Optional[tuple[tuple[int, int], ...]] = None
+
+    def mark_dirty(self, *_args) -> None:
+        """ OperatorItem や KeyMapItem の変更時に呼ばれ、次回の ensure() での再構築とスナップショットの保存を予約する
+        """
+        self.dirty = True
+        schedule_snapshot()
+
+    def watch_properties(self, key_items: list[KeyMapItem]) -> None:
+        """ 設定画面で表示中の KeyMapItem.properties が前回の描画から変わっていれば、設定の保存を予約する
+        properties の変更は msgbus で通知されないため、描画のたびに値を比べる. 描画中に呼ばれるので、書き込みはしない
+
+        key_items (list[bpy.types.KeyMapItem]): 表示中の OperatorItem の KeyMapItem
+        """
+        checksums = tuple((kmi.id, properties_checksum(kmi.properties)) for kmi in key_items)
+        if self.drawn_checksums is not None and checksums != self.drawn_checksums \
+                and {i for i, _ in checksums} == {i for i, _ in self.drawn_checksums}:
+            schedule_snapshot()
+        self.drawn_checksums = checksums
+
+    def kwargs_for(self, entry: dict[str, Any]) -> MappingProxyType:
+        """ entry のオペレーターに渡すキーワード引数を返す
+        スナップショットは作成時の idname と properties_checksum() が現在と一致する場合のみ再利用する
+        KeyMapItem.properties の変更は msgbus で通知されないことがあるため、値そのものを比べる
+
+        entry (dict[str, Any]): ChordNode.entry またはその "macro" の要素
+        """
+        key_item = entry["key_item"]
+        properties = key_item.properties
+        checksum = properties_checksum(properties)
+        snapshot = entry["kwargs"]
+        if snapshot is not None:
+            idname, old_checksum, kwargs = snapshot
+            if idname == key_item.idname and old_checksum == checksum:
+                return kwargs
+            # 設定の変更を見つけたので、保存も予約する
+            schedule_snapshot()
+        kwargs = properties_to_kwargs(properties)
+        entry["kwargs"] = (key_item.idname, checksum, kwargs)
+        return kwargs
+
+    def activate(self, name: str) -> None:
+        """ 使用するプロファイルを切り替える. 作成済みのトライ木の参照を差し替えるだけで、再構築は行わない
+
+        name (str): プロファイル名
+        """
+        self.active_profile = name
+        self.tables = self.profiles.get(name, {})
+        self.has_timeout = self.timeouts.get(name, False)
+
+    def ensure(self, context: Context) -> dict[tuple[str, str], ChordNode]:
+        """ 変更があった場合のみトライ木を再構築し、使用中のプロファイルの最新の表を返す
+
+        context (bpy.types.Context): context
+        """
+        if self.dirty:
+            self.rebuild(context)
+        return self.tables
+
+    def table_for(self, context: Context) -> Optional[ChordNode]:
+        """ 現在のエディターとモードに対応するトライ木の根を返す. 無い場合は None
+
+        context (bpy.types.Context): context
+        """
+        tables = self.ensure(context)
+        space_type = context.area.type if context.area else ""
+        table = tables.get((space_type, context.mode))
+        if table is None:
+            table = tables.get((space_type, 'ANY'))
+        return table
+
+    def position_of(self, context: Context, idx: int) -> int:
+        """ OperatorItem.idx が idx である OperatorItem の、AddonPrefs.op_items での位置を返す. 無い場合は -1
+        記録した位置が古くなっていた場合は positions だけを作り直し、トライ木は作り直さない
+
+        context (bpy.types.Context): context
+        idx (int): OperatorItem.idx
+        """
+        op_items = context.preferences.addons[__name__].preferences.op_items
+        i = self.positions.get(idx, -1)
+        if not (0 <= i < len(op_items) and op_items[i].idx == idx):
+            self.positions = {item.idx: n for n, item in enumerate(op_items)}
+            i = self.positions.get(idx, -1)
+        return i
+
+    def rebuild(self, context: Context) -> None:
+        """ AddonPrefs.op_items から、プロファイルと (space_type, mode) ごとのトライ木を作り直す
+        最後のキーが無効 (active が False) なものは登録しない
+
+        context (bpy.types.Context): context
+        """
+        prefs = context.preferences.addons[__name__].preferences
+        kc = context.window_manager.keyconfigs.addon
+        keymap = kc.keymaps.find(__name__) if kc else None
+        main_kmi = prefs._main_kmi
+        self.positions = {item.idx: i for i, item in enumerate(prefs.op_items)}
+        self.conflicts = {}
+        self.profiles = {}
+        self.timeouts = {}
+        if keymap and main_kmi:
+            sync_trigger_keys(main_kmi)
+            key_items = {kmi.id: kmi for kmi in keymap.keymap_items}
+            groups: dict[tuple[str, str, str], list[tuple[Any, list[KeyMapItem]]]] = {}
+            for item in prefs.op_items:
+                steps = [key_items.get(step.idx) for step in item.prefix]
+                steps.append(key_items.get(item.idx))
+                if any(kmi is None for kmi in steps) or not steps[-1].active:
+                    continue
+                groups.setdefault((item.profile, item.space_type, item.mode), []).append((item, steps))
+                if item.timeout > 0:
+                    self.timeouts[item.profile] = True
+            self.compile_groups(main_kmi, groups, key_items)
+        self.activate(prefs.active_profile)
+        self.dirty = False
+
+    def compile_groups(self, main_kmi: KeyMapItem, groups: dict[tuple[str, str, str], list[tuple[Any, list[KeyMapItem]]]],
+                       key_items: dict[int, KeyMapItem]) -> None:
+        """ (プロファイル, space_type, mode) ごとにまとめた OperatorItem から、profiles の表を作成する
+        mode が 'ANY' のものは、同じプロファイルとエディターの他のモードの表にも含める
+
+        main_kmi (bpy.types.KeyMapItem): モーダルモード移行キー
+        groups (dict[tuple[str, str, str], list[tuple[OperatorItem, list[KeyMapItem]]]]):
+            {(プロファイル名, space_type, mode): [(OperatorItem, そのキーの列)]}
+        key_items (dict[int, KeyMapItem]): {id: KeyMapItem}
+        """
+        for (profile, space_type, mode), members in groups.items():
+            tables = self.profiles.setdefault(profile, {})
+            if mode == 'ANY':
+                tables[(space_type, mode)] = self.compile(main_kmi, members, key_items)
+            else:
+                shared = groups.get((profile, space_type, 'ANY'), [])
+                tables[(space_type, mode)] = self.compile(main_kmi, shared + members, key_items)
+
+    def compile(self, main_kmi: KeyMapItem, members: list[tuple[Any, list[KeyMapItem]]],
+                key_items: dict[int, KeyMapItem]) -> ChordNode:
+        """ OperatorItem とそのキーの列から1つのトライ木を作成し、その根を返す
+        各 OperatorItem は 前置キー (prefix) → 最後のキー (idx) の列として登録される
+        同じキー入力の列を持つものは conflicts に記録し、後のものを優先する
+
+        main_kmi (bpy.types.KeyMapItem): モーダルモード移行キー
+        members (list[tuple[OperatorItem, list[KeyMapItem]]]): OperatorItem とそのキーの列
+        key_items (dict[int, KeyMapItem]): {id: KeyMapItem}. マクロの各ステップの KeyMapItem を引くのに使う
+        """
+        root = ChordNode(key_to_string(main_kmi))
+        base_mods = key_to_code(main_kmi) & MOD_MASK
+        conflicts = self.conflicts
+        event_types = set()
+        for item, steps in members:
+            node = root
+            for kmi in steps:
+                event_types.add(kmi.type)
+                node.merge_timeout(item.timeout)
+                codes = chord_codes(base_mods, kmi)
+                child = next((node.children[c] for c in codes if c in node.children), None)
+                if child is None:
+                    child = ChordNode(key_to_string(kmi))
+                for code in codes:
+                    node.children.setdefault(code, child)
+                node = child
+            if node.entry is not None:
+                other = node.entry["item_idx"]
+                conflicts.setdefault(other, set()).add(item.idx)
+                conflicts.setdefault(item.idx, set()).add(other)
+            macro = []
+            for step in item.macro:
+                kmi = key_items.get(step.idx)
+                if kmi is not None and kmi.idname != "":
+                    macro.append({"key_item": kmi, "exec_context": step.exec_context, "kwargs": None})
+            node.entry = {"key_item": steps[-1], "exec_context": item.exec_context, "kwargs": None,
+                          "name": steps[-1].name or steps[-1].idname, "item_idx": item.idx, "macro": macro}
+        root.event_types = frozenset(event_types)
+        return root
+
+
+chord_index = ChordIndex()
+
+
+class ConflictIndex:
+    """ keyconfigs.user / default の全 KeyMapItem を、正規化したキー設定で引くための索引
+    モーダルモード移行キーが既存のショートカットと重なっていないかを調べるのに使う
+
+    index (dict[tuple[str, int, int], list[tuple[str, str, str, str]]]):
+        {(キーマップ名, キーの種類, 補助キーのビット (any は -1)): [(keyconfig名, キーマップ名, オペレーター名, value)]}
+    signature (tuple[int, ...]): 索引作成時のキーマップと KeyMapItem の数
+        KeyMapItem の追加・削除はこれで、既存の KeyMapItem の変更は msgbus からの invalidate() で検出する
+    """
+    # どのエディターでも有効なキーマップ
+    GLOBAL_KEYMAPS = ("Window", "Screen")
+
+    def __init__(self):
+        self.index: dict[tuple[str, int, int], list[tuple[str, str, str, str]]] = {}
+        self.signature: tuple[int, ...] = ()
+
+    def invalidate(self, *_args) -> None:
+        """ 索引を破棄し、次の ensure() で作り直す
+        """
+        self.signature = ()
+
+    @staticmethod
+    def keyconfigs(context: Context) -> list[Any]:
+        wm = context.window_manager
+        return [kc for kc in (wm.keyconfigs.user, wm.keyconfigs.default) if kc]
+
+    def ensure(self, context: Context) -> None:
+        """ キーマップと KeyMapItem の数が変わっていれば索引を作り直す
+
+        context (bpy.types.Context): context
+        """
+        signature = tuple(
+            len(km.keymap_items) for kc in self.keyconfigs(context) for km in kc.keymaps
+        )
+        if signature != self.signature:
+            self.rebuild(context)
+            self.signature = signature
+
+    def rebuild(self, context: Context) -> None:
+        """ 全 KeyMapItem を1度ずつ走査して索引を作り直す
+        keyconfigs.user にはこのアドオンのモーダルモード移行キーも含まれるため、それは除く
+
+        context (bpy.types.Context): context
+        """
+        index: dict[tuple[str, int, int], list[tuple[str, str, str, str]]] = {}
+        own_idname = WM_OT_three_keys_operator.bl_idname
+        for kc in self.keyconfigs(context):
+            for km in kc.keymaps:
+                for kmi in km.keymap_items:
+                    if not kmi.active or kmi.map_type not in {'KEYBOARD', 'MOUSE'} or kmi.idname == own_idname:
+                        continue
+                    code = key_to_code(kmi)
+                    mods = -1 if kmi.any else code & MOD_MASK
+                    key = (km.name, code >> MOD_BITS, mods)
+                    index.setdefault(key, []).append((kc.name, km.name, kmi.name or kmi.idname, kmi.value))
+        self.index = index
+
+    def find(self, keymap_name: str, item: KeyMapItem) -> list[tuple[str, str, str, str]]:
+        """ item と同じキー設定を持つ KeyMapItem の情報を返す
+        keymap_name のキーマップと、どのエディターでも有効なキーマップを調べる
+
+        keymap_name (str): item が登録されているキーマップの名前
+        item (bpy.types.KeyMapItem): 調べる KeyMapItem
+        """
+        code = key_to_code(item)
+        type_id, mods = code >> MOD_BITS, code & MOD_MASK
+        found = []
+        for name in (keymap_name,) + self.GLOBAL_KEYMAPS:
+            for m in (mods, -1):
+                for hit in self.index.get((name, type_id, m), []):
+                    if hit[3] == item.value or 'ANY' in (hit[3], item.value):
+                        found.append(hit)
+        return found
+
+
+conflict_index = ConflictIndex()
+
+
+class ChordSession:
+    """ モーダルモード中のキー入力を処理する状態機械
+    bpy.types.Event と同じ属性 (type, value, shift, ctrl, alt, oskey) を持つものなら何でも受け取れるため、
+    WM_OT_three_keys_operator.modal() と記録したイベントの再生 (WM_OT_events_replay) の両方で使う
+
+    root (ChordNode): トライ木の根
+    node (ChordNode): トライ木の現在の節
+    path (list[str]): ここまでに入力されたキーの表示用の文字列
+    trigger_type (str): モーダルモード移行キーの Event.type
+    sticky (bool): 連続入力モードか. オペレーターの実行後も終了せずに根に戻る
+    ignored (frozenset[str]): 最初の判定で無視する Event.type の集合
+        キー入力ではないイベント (マウスの移動・トラックパッド・NDOF・タイマーなど) と補助キーのみを含み、
+        登録されていないキーは無視せず、モーダルモードを終了させる (連続入力モードでは根に戻る)
+    deadline (float): 現在の節での入力の締め切り. 0 のときは無制限
+    """
+    # feed() が返す処理の種類
+    REJECT = 0
+    IGNORE = 1
+    ADVANCE = 2
+    DISPATCH = 3
+    DISPATCH_END = 4
+    RESTART = 5
+    END = 6
+
+    PRESS_VALUES = frozenset(["PRESS", "CLICK", "DOUBLE_CLICK", "CLICK_DRAG"])
+
+    # キー入力として扱わないイベント. 補助キーは、それを押しながら次のキーを押すために無視する
+    NON_KEY_EVENT_TYPES = frozenset(t for t in [
+        'NONE', 'MOUSEMOVE', 'INBETWEEN_MOUSEMOVE', 'TRACKPADPAN', 'TRACKPADZOOM', 'MOUSEROTATE',
+        'MOUSESMARTZOOM', 'NDOF_MOTION', 'WINDOW_DEACTIVATE', 'TEXTINPUT',
+        'TIMER', 'TIMER0', 'TIMER1', 'TIMER2', 'TIMER_JOBS', 'TIMER_AUTOSAVE', 'TIMER_REPORT', 'TIMERREGION',
+        'ACTIONZONE_AREA', 'ACTIONZONE_REGION', 'ACTIONZONE_FULLSCREEN', 'XR_ACTION',
+        'LEFT_SHIFT', 'RIGHT_SHIFT', 'LEFT_CTRL', 'RIGHT_CTRL', 'LEFT_ALT', 'RIGHT_ALT', 'OSKEY',
+    ] if t in EVENT_TYPE_IDS)
+
+    __slots__ = ("root", "node", "path", "trigger_type", "sticky", "ignored", "deadline")
+
+    def __init__(self, root: ChordNode, trigger_type: str, sticky: bool, use_timer: bool, now: float):
+        """
+        root (ChordNode): トライ木の根
+        trigger_type (str): モーダルモード移行キーの Event.type
+        sticky (bool): 連続入力モードか
+        use_timer (bool): タイムアウト判定のための TIMER イベントを処理するか
+        now (float): 現在時刻
+        """
+        self.root = root
+        self.trigger_type = trigger_type
+        self.sticky = sticky
+        # チョードや移行キーに使われているものは無視しない
+        ignored = self.NON_KEY_EVENT_TYPES - root.event_types - {trigger_type}
+        if use_timer:
+            ignored -= {'TIMER'}
+        self.ignored = ignored
+        self.restart(now)
+
+    def enter(self, node: ChordNode, now: float) -> None:
+        """ トライ木の節 node に移り、その節の締め切りを設定する
+        """
+        self.node = node
+        self.path.append(node.label)
+        self.deadline = now + node.timeout if node.timeout else 0.0
+
+    def restart(self, now: float) -> None:
+        """ トライ木の根に戻る
+        """
+        self.path = []
+        self.enter(self.root, now)
+
+    def expire(self) -> tuple[int, Optional[dict[str, Any]]]:
+        """ 入力待ちの終了. 現在の節で確定するオペレーターがあれば実行する
+        連続入力モードでは、確定するものが無ければ根に戻る
+        """
+        if self.node.entry is not None:
+            return (self.DISPATCH, self.node.entry)
+        return (self.RESTART if self.sticky else self.END, None)
+
+    def feed(self, event: Any, now: float) -> tuple[int, Optional[dict[str, Any]]]:
+        """ イベントを1つ処理し、(処理の種類, 実行するオペレーターの ChordNode.entry) を返す
+
+        event (bpy.types.Event | ReplayEvent): イベント
+        now (float): イベントを受け取った時刻
+        """
+        event_type = event.type
+        if event_type in self.ignored:
+            return (self.REJECT, None)
+        if event_type == 'TIMER':
+            if self.deadline and now >= self.deadline:
+                return self.expire()
+            return (self.IGNORE, None)
+        elif event_type == self.trigger_type:
+            if event.value != "RELEASE":
+                return (self.IGNORE, None)
+            if not self.sticky:
+                return self.expire()
+            if self.node.entry is not None:
+                return (self.DISPATCH_END, self.node.entry)
+            return (self.END, None)
+        elif event_type == 'ESC':
+            return (self.END, None)
+        elif event.value not in self.PRESS_VALUES:
+            return (self.IGNORE, None)
+
+        if self.deadline and now >= self.deadline:
+            return self.expire()
+
+        node = self.node.children.get(event_to_code(event))
+        if node is None:
+            return (self.RESTART if self.sticky else self.END, None)
+        elif not node.children:
+            return (self.DISPATCH, node.entry)
+        self.enter(node, now)
+        return (self.ADVANCE, None)
+
+
+# ----- event recording -------------
+class ReplayEvent:
+    """ 記録したイベントを ChordSession.feed() に渡すための、bpy.types.Event の代わり
+    """
+    __slots__ = ("type", "value", "shift", "ctrl", "alt", "oskey")
+
+    def __init__(self, type: str, value: str, shift: bool, ctrl: bool, alt: bool, oskey: bool):
+        self.type = type
+        self.value = value
+        self.shift = shift
+        self.ctrl = ctrl
+        self.alt = alt
+        self.oskey = oskey
+
+
+def event_to_record(event: Event, t: float) -> list[Any]:
+    """	Event を記録用のリスト [経過秒数, type, value, shift, ctrl, alt, oskey] にする
+
+    event (bpy.types.Event) : Event
+    t (float) : invoke からの経過秒数
+    """
+    return [round(t, 6), event.type, event.value, event.shift, event.ctrl, event.alt, event.oskey]
+
+
+def recording_path(prefs: Any) -> str:
+    """	イベントの記録の書き出し先を返す. 未設定の場合はユーザー設定のフォルダーの events.jsonl
+
+    prefs (AddonPrefs) : アドオン設定
+    """
+    if prefs.record_path != "":
+        return bpy.path.abspath(prefs.record_path)
+    directory = bpy.utils.user_resource('CONFIG', path="three_keys_shortcut", create=True)
+    return os.path.join(directory, "events.jsonl")
+
+
+def write_recording(path: str, header: dict[str, Any], events: list[list[Any]]) -> None:
+    """	1回のモーダルモードで記録したイベントを JSON Lines 形式でファイルに追記する
+    1行目がヘッダー (辞書)、2行目以降が event_to_record() 形式のリストになる
+
+    path (str) : 書き出し先
+    header (dict[str, Any]) : ヘッダー
+    events (list[list[Any]]) : event_to_record() 形式のリストのリスト
+    """
+    try:
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(header, separators=(",", ":")) + "\n")
+            for record in events:
+                f.write(json.dumps(record, separators=(",", ":")) + "\n")
+    except OSError as e:
+        print(f"{__name__}: failed to write the recorded events: {e}")
+
+
+def read_recording(f: Any) -> tuple[list[tuple[dict[str, Any], list[ReplayEvent], list[float]]], list[str]]:
+    """	write_recording() で書き出したファイルを読み込み、([(ヘッダー, イベントのリスト, 経過秒数のリスト)], エラーのリスト) を返す
+    書き込みの途中で終わった行などの読めない行は飛ばし、行番号付きのメッセージとして返す
+
+    f (TextIO) : 読み込むファイル
+    """
+    sessions = []
+    errors = []
+    for lineno, line in enumerate(f, start=1):
+        line = line.strip()
+        if line == "":
+            continue
+        try:
+            data = json.loads(line)
+        except ValueError as e:
+            errors.append(f"line {lineno}: {e}")
+            continue
+        if isinstance(data, dict):
+            sessions.append((data, [], []))
+        elif sessions and isinstance(data, list) and len(data) == 7:
+            t, event_type, value, shift, ctrl, alt, oskey = data
+            sessions[-1][1].append(ReplayEvent(event_type, value, shift, ctrl, alt, oskey))
+            sessions[-1][2].append(t)
+        else:
+            errors.append(f"line {lineno}: not an event record")
+    return sessions, errors
+
+
+class RecordKeyItem:
+    """ key_to_record() 形式の辞書から作る、KeyMapItem の代わりの値
+    トライ木の作成とキーワード引数の生成に使う属性だけを持ち、キーマップの無い --background モードでも作成できる
+
+    id (int): KeyMapItem.id の代わりの連番
+    idname (str): オペレーターの bl_idname
+    name (str): 表示名. idname と同じ
+    properties (dict[str, Any]): properties_to_record() 形式の辞書
+    その他の属性は KeyMapItem の同名の属性と同じ
+    """
+    __slots__ = ("id", "idname", "name", "type", "value", "any", "shift", "ctrl", "alt", "oskey",
+                 "shift_ui", "ctrl_ui", "alt_ui", "oskey_ui", "active", "properties")
+
+    def __init__(self, id: int, idname: str, key: dict[str, Any], properties: dict[str, Any]):
+        self.id = id
+        self.idname = idname
+        self.name = idname
+        self.type = key.get("type", "NONE")
+        self.value = key.get("value", "PRESS")
+        self.any = key.get("any", False)
+        self.shift = key.get("shift", 0)
+        self.ctrl = key.get("ctrl", 0)
+        self.alt = key.get("alt", 0)
+        self.oskey = key.get("oskey", 0)
+        self.shift_ui = self.shift == 1
+        self.ctrl_ui = self.ctrl == 1
+        self.alt_ui = self.alt == 1
+        self.oskey_ui = self.oskey == 1
+        self.active = key.get("active", True)
+        self.properties = properties
+
+
+def records_to_index(trigger: dict[str, Any], records: list[dict[str, Any]]) -> ChordIndex:
+    """	item_to_record() 形式の辞書のリストから、アドオンのキーマップを使わずに ChordIndex を作る
+    イベントの記録の再生に使う. 各エントリーのキーワード引数は記録された properties から作っておく
+
+    trigger (dict[str, Any]) : モーダルモード移行キーの key_to_record() 形式の辞書
+    records (list[dict[str, Any]]) : 検証済みの item_to_record() 形式の辞書のリスト
+    """
+    index = ChordIndex()
+    key_items: dict[int, RecordKeyItem] = {}
+
+    def add_key(idname: str, key: dict[str, Any], properties: dict[str, Any]) -> RecordKeyItem:
+        kmi = RecordKeyItem(len(key_items) + 1, idname, key, properties)
+        key_items[kmi.id] = kmi
+        return kmi
+
+    groups: dict[tuple[str, str, str], list[tuple[Any, list[RecordKeyItem]]]] = {}
+    for record in records:
+        steps = [add_key("", key, {}) for key in record.get("prefix", [])]
+        steps.append(add_key(record.get("idname", ""), record["key"], record.get("properties", {})))
+        if not steps[-1].active:
+            continue
+        macro = [SimpleNamespace(idx=add_key(step.get("idname", ""), {}, step.get("properties", {})).id,
+                                 exec_context=step.get("exec_context", "INVOKE_DEFAULT"))
+                 for step in record.get("macro", [])]
+        profile = record.get("profile", DEFAULT_PROFILE)
+        timeout = record.get("timeout", 0.0)
+        item = SimpleNamespace(idx=steps[-1].id, timeout=timeout, macro=macro,
+                               exec_context=record.get("exec_context", "INVOKE_DEFAULT"))
+        groups.setdefault((profile, record.get("space_type", "VIEW_3D"), record.get("mode", "ANY")), []) \
+            .append((item, steps))
+        if timeout > 0:
+            index.timeouts[profile] = True
+    index.compile_groups(RecordKeyItem(0, "", trigger, {}), groups, key_items)
+
+    # 記録された properties は RNA の型を持たないので、配列は tuple にしてそのまま使う
+    for tables in index.profiles.values():
+        for root in tables.values():
+            stack = [root]
+            while stack:
+                node = stack.pop()
+                stack.extend({id(c): c for c in node.children.values()}.values())
+                if node.entry is not None:
+                    for entry in [node.entry] + node.entry["macro"]:
+                        kmi = entry["key_item"]
+                        kwargs = MappingProxyType({k: tuple(v) if isinstance(v, list) else v
+                                                   for k, v in kmi.properties.items()})
+                        entry["kwargs"] = (kmi.idname, properties_checksum(kmi.properties), kwargs)
+    index.dirty = False
+    return index
+
+# KeyMapItem のうち、辞書の内容に影響するプロパティ
+WATCHED_KMI_PROPS = [
+    "type", "value", "map_type", "idname", "active",
+    "any", "shift_ui", "ctrl_ui", "alt_ui", "oskey_ui", "key_modifier"
+]
+
+
+class LatencyRecorder:
+    """ キー入力からオペレーター実行までの処理時間を、段階ごとに固定長のリングバッファへ記録する
+
+    size (int): 段階ごとに保持するサンプル数
+    samples (dict[str, array]): {段階名: 秒数のリングバッファ}
+    counts (dict[str, int]): {段階名: これまでに記録した回数}
+    events (dict[str, int]): モーダルモード中のイベントの数. "rejected" は最初の判定で無視したもの、"handled" はそれ以外
+    """
+    STAGES = ("invoke", "lookup", "resolve", "teardown", "kwargs", "execute", "dispatch")
+
+    def __init__(self, size: int = 1024):
+        self.size = size
+        self.samples = {stage: array('d', [0.0]) * size for stage in self.STAGES}
+        self.counts = {stage: 0 for stage in self.STAGES}
+        self.events = {"rejected": 0, "handled": 0}
+
+    def record(self, stage: str, seconds: float) -> None:
+        """ 処理時間を1つ記録する. 古いものから上書きされる
+
+        stage (str): 段階名. STAGES のいずれか
+        seconds (float): 処理時間 (秒)
+        """
+        n = self.counts[stage]
+        self.samples[stage][n % self.size] = seconds
+        self.counts[stage] = n + 1
+
+    def clear(self) -> None:
+        """ 記録をすべて破棄する
+        """
+        for stage in self.STAGES:
+            self.counts[stage] = 0
+        for name in self.events:
+            self.events[name] = 0
+
+    def percentiles(self, stage: str, qs: tuple[int, ...] = (50, 95, 99)) -> Optional[list[float]]:
+        """ 保持しているサンプルのパーセンタイル値 (秒) を返す. サンプルが無い場合は None
+
+        stage (str): 段階名
+        qs (tuple[int, ...]): 求めるパーセンタイル. デフォルト (50, 95, 99)
+        """
+        n = min(self.counts[stage], self.size)
+        if n == 0:
+            return None
+        data = sorted(self.samples[stage][:n])
+        return [data[min(n - 1, n * q // 100)] for q in qs]
+
+    def summary(self, with_samples: bool = False) -> dict[str, dict[str, Any]]:
+        """ 段階ごとの記録回数と p50/p95/p99 (ミリ秒) の辞書を返す
+
+        with_samples (bool): 保持しているサンプル (ミリ秒) も含める. デフォルト False
+        """
+        result = {}
+        for stage in self.STAGES:
+            values = self.percentiles(stage)
+            data = {"count": self.counts[stage]}
+            if values:
+                data.update({f"p{q}_ms": v * 1000 for q, v in zip((50, 95, 99), values)})
+            if with_samples:
+                n = min(self.counts[stage], self.size)
+                data["samples_ms"] = [v * 1000 for v in self.samples[stage][:n]]
+            result[stage] = data
+        return result
+
+
+latency = LatencyRecorder()
+
+
+class OperatorResolver:
+    """ 'module.op' 形式の idname から bpy.ops の呼び出し可能オブジェクトを引くためのキャッシュ
+
+    cache (dict[str, Any]): {idname: オペレーター | None}. None は存在しない idname を表す
+    signature (tuple[str, ...]): キャッシュ作成時に有効だったアドオンの一覧
+    """
+    def __init__(self):
+        self.cache: dict[str, Any] = {}
+        self.signature: tuple[str, ...] = ()
+
+    def invalidate(self, *_args) -> None:
+        """ キャッシュを破棄する
+        """
+        self.cache.clear()
+
+    def validate(self, context: Context) -> None:
+        """ 有効なアドオンの構成が変わっていれば (= オペレーターが増減した可能性があれば) キャッシュを破棄する
+
+        context (bpy.types.Context): context
+        """
+        signature = tuple(context.preferences.addons.keys())
+        if signature != self.signature:
+            self.cache.clear()
+            self.signature = signature
+
+    def resolve(self, name: str):
+        """ idname に対応する bpy.ops のオペレーターを返す. 存在しない場合は None
+
+        name (str): 'module.op' 形式の idname
+        """
+        if name in self.cache:
+            return self.cache[name]
+        split = name.split('.')
+        op = None
+        if len(split) == 2:
+            m, o = split
+            if m in dir(bpy.ops):
+                mod = getattr(bpy.ops, m)
+                if o in dir(mod):
+                    op = getattr(mod, o)
+        self.cache[name] = op
+        return op
+
+
+operator_resolver = OperatorResolver()
+
+
+class PollCache:
+    """ オペレーターの poll() の結果を、コンテキストの特徴 (エディターの種類, モード, アクティブなオブジェクトの種類) ごとに保持する
+    invoke のたびに begin() で破棄するため、1回のモーダルモードの中では同じ特徴について poll() を1回だけ呼ぶ
+
+    results (dict[tuple, dict[tuple[str, str], bool]]): {特徴: {(idname, exec_context): poll() の結果}}
+    current (dict[tuple[str, str], bool]): 現在のコンテキストの特徴に対応する results の要素
+    last (dict[int, bool]): {OperatorItem.idx: 最後に調べたときに実行できたか}. 設定画面の一覧での表示に使う
+    """
+    def __init__(self):
+        self.results: dict[tuple, dict[tuple[str, str], bool]] = {}
+        self.current: dict[tuple[str, str], bool] = {}
+        self.last: dict[int, bool] = {}
+
+    @staticmethod
+    def signature(context: Context) -> tuple[str, str, Optional[str]]:
+        """ poll() の結果を共有できるコンテキストの特徴を返す
+
+        context (bpy.types.Context): context
+        """
+        obj = context.active_object
+        return (context.area.type, context.mode, obj.type if obj else None)
+
+    def begin(self, context: Context) -> None:
+        """ invoke の開始時に呼ばれ、前回のモーダルモードの結果を破棄する
+
+        context (bpy.types.Context): context
+        """
+        self.results.clear()
+        self.update(context)
+
+    def update(self, context: Context) -> None:
+        """ オペレーターの実行後など、コンテキストが変わった可能性があるときに呼ばれ、current を切り替える
+
+        context (bpy.types.Context): context
+        """
+        self.current = self.results.setdefault(self.signature(context), {})
+
+    def available(self, entry: dict[str, Any]) -> bool:
+        """ entry のオペレーターが現在のコンテキストで実行できるかを返す. マクロは最初のステップのみを調べる
+
+        entry (dict[str, Any]): ChordNode.entry
+        """
+        key_item = entry["key_item"]
+        key = (key_item.idname, entry["exec_context"])
+        result = self.current.get(key)
+        if result is None:
+            operator = operator_resolver.resolve(key_item.idname)
+            result = operator != None and bool(operator.poll(entry["exec_context"]))
+            self.current[key] = result
+        self.last[entry["item_idx"]] = result
+        return result
+
+
+poll_cache = PollCache()
+
+
+def subscribe_keymap_changes(owner: object) -> None:
+    """ KeyMapItem の変更を msgbus で監視し、変更時に chord_index を dirty にする
+    idname の変更時には operator_resolver のキャッシュも破棄し、
+    オペレーター設定の変更時には kwargs のスナップショットを無効にする
+
+    owner (object): msgbus の購読者として使うオブジェクト
+    """
+    for prop in WATCHED_KMI_PROPS:
+        bpy.msgbus.subscribe_rna(
+            key=(KeyMapItem, prop), owner=owner, args=(),
+            notify=chord_index.mark_dirty, options={'PERSISTENT'}
+        )
+        # 既存のショートカットのキー設定の変更は、KeyMapItem の数の比較では検出できない
+        bpy.msgbus.subscribe_rna(
+            key=(KeyMapItem, prop), owner=owner, args=(),
+            notify=conflict_index.invalidate, options={'PERSISTENT'}
+        )
+    bpy.msgbus.subscribe_rna(
+        key=(KeyMapItem, "idname"), owner=owner, args=(),
+        notify=operator_resolver.invalidate, options={'PERSISTENT'}
+    )
+
+
+def sync_trigger_keys(main_kmi: KeyMapItem) -> None:
+    """ 各エディターに登録したモーダルモード移行キーのキー設定を main_kmi に揃える
+    値が異なるものだけを書き換え、msgbus の通知が繰り返されないようにする
+
+    main_kmi (bpy.types.KeyMapItem): アドオン設定で編集されるモーダルモード移行キー
+    """
+    props = ["type", "value", "any", "shift", "ctrl", "alt", "oskey", "key_modifier"]
+    for _km, kmi in addon_keymaps:
+        if kmi == main_kmi:
+            continue
+        for prop in props:
+            value = getattr(main_kmi, prop)
+            if getattr(kmi, prop) != value:
+                setattr(kmi, prop, value)
+
+
+def index_update(self, context):
+    """ OperatorItem のプロパティの update 関数
+    """
+    chord_index.mark_dirty()
+
+
+def profile_update(self, context):
+    """ AddonPrefs.active_profile の update 関数. KeyMapItem には触れず、作成済みのトライ木に切り替える
+    """
+    chord_index.activate(self.active_profile)
+    schedule_snapshot()
 
 
 # ----- property class --------------
+class ChordProfile(bpy.types.PropertyGroup):
+    """ キー設定のまとまり (モデリング用、リギング用など). 名前 (name) で OperatorItem.profile から参照される
+    """
+    pass
+
+
+class ChordStep(bpy.types.PropertyGroup):
+    """ 最後のキーより前に入力するキーの設定
+
+    idx (int) : キー設定が格納されている KeyMapItem の id. デフォルト -1
+    """
+    idx: IntProperty(name="index", default=-1, update=index_update)
+
+
+class MacroStep(bpy.types.PropertyGroup):
+    """ マクロとして続けて実行するオペレーターの設定
+
+    idx (int) : オペレーターとその設定が格納されている KeyMapItem の id. キー設定は使わない. デフォルト -1
+    execution_context (enum of Operator Context Items) : 'EXEC_DEFAULT' など
+    """
+    idx: IntProperty(name="index", default=-1, update=index_update)
+    exec_context: EnumProperty(
+        name='Execution Context',
+        items=[(s, s, '') for s in EXEC_CONTEXT_NAMES],
+        default='EXEC_DEFAULT',
+        update=index_update
+    )
+
+
 class OperatorItem(bpy.types.PropertyGroup):
     """ キー入力とそれに対応するオペレーターの設定
 
     show_expanded (bool) : 詳細表示の有無
+    select (bool) : 一覧での選択状態. WM_OT_keyitem_bulk の対象になる
+    space_type (enum) : チョードを使うエディター
+    mode (enum) : チョードを使うモード. 'ANY' はすべてのモード
+    profile (str) : 所属するプロファイル (ChordProfile.name)
     idx (int) : オペレーターが格納されている KeyMapItem の id. デフォルト -1
+    prefix (Collection of ChordStep) : 最後のキーより前に入力するキーの列
+    timeout (float) : 各キーの入力を待つ秒数. 0 のときは無制限
     execution_context (enum of Operator Context Items) : 'INVOKE_DEFAULT' など
+    macro (Collection of MacroStep) : 最初のオペレーターに続けて実行するオペレーターの列
     """
     show_expanded: BoolProperty( name='Show Details', default=False)
-    idx: IntProperty(name="index", default=-1)
+    select: BoolProperty( name='Select', default=False)
+    idx: IntProperty(name="index", default=-1, update=index_update)
+    prefix: CollectionProperty(name="Prefix Keys", type=ChordStep)
+    space_type: EnumProperty(
+        name="Editor",
+        items=[(space, label, "") for space, _km, label, _cls in CHORD_SPACES],
+        default='VIEW_3D',
+        update=index_update
+    )
+    mode: EnumProperty(
+        name="Mode",
+        items=[(m, m.replace("_", " ").title(), "") for m in CHORD_MODES],
+        default='ANY',
+        update=index_update
+    )
+    profile: StringProperty(name="Profile", default=DEFAULT_PROFILE, update=index_update)
+    timeout: FloatProperty(name="Timeout", default=0.0, min=0.0, soft_max=5.0,
+                           subtype='TIME', unit='TIME', update=index_update)
     exec_context: EnumProperty(
         name='Execution Context',
-        items=[(s, s, '') for s in
-               ['INVOKE_DEFAULT', 'INVOKE_REGION_WIN',
-                'INVOKE_REGION_CHANNELS', 'INVOKE_REGION_PREVIEW',
-                'INVOKE_AREA', 'INVOKE_SCREEN', 'EXEC_DEFAULT',
-                'EXEC_REGION_WIN', 'EXEC_REGION_CHANNELS',
-                'EXEC_REGION_PREVIEW', 'EXEC_AREA', 'EXEC_SCREEN']],
-        default='INVOKE_DEFAULT'
+        items=[(s, s, '') for s in EXEC_CONTEXT_NAMES],
+        default='INVOKE_DEFAULT',
+        update=index_update
     )
+    macro: CollectionProperty(name="Macro Steps", type=MacroStep)
+
+    def key_item_ids(self) -> list[int]:
+        """ この OperatorItem が使う KeyMapItem の id をすべて返す (前置キー・最後のキー・マクロの各ステップ)
+        """
+        return [step.idx for step in self.prefix] + [self.idx] + [step.idx for step in self.macro]
 
-    def draw(self, context:Context, layout:UILayout):
+    def draw(self, context:Context, layout:UILayout, key_items: dict[int, KeyMapItem]):
+        """ キー設定の詳細を描画する
+
+        key_items (dict[int, KeyMapItem]): {id: KeyMapItem}. key_items_by_id() で作成したもの
+        """
         base = layout.column()
         base.context_pointer_set('group_item', self)
-        item = context.window_manager.keyconfigs.addon.keymaps[__name__].keymap_items.from_id(self.idx)
+        item = key_items.get(self.idx)
+        if item is None:
+            return
         
         draw_main_row(
             self, context, base, item, use_active=False,
@@ -331,31 +1767,94 @@ class OperatorItem(bpy.types.PropertyGroup):
             custom_remove_prop={"method":"remove_item"}
         )
 
+        others = chord_index.conflicts.get(self.idx, [])
+        if others:
+            op_items = context.preferences.addons[__name__].preferences.op_items
+            col = base.column()
+            col.alert = True
+            for other in others:
+                i = chord_index.position_of(context, other)
+                kmi = key_items.get(op_items[i].idx) if i >= 0 else None
+                if kmi:
+                    col.label(text=f"同じキー入力: {kmi.name or '未設定'} ({i + 1}番目)", icon='ERROR')
+
         if self.show_expanded:
             def draw_exec_context(self, layout, item):
                 row = layout.row()
                 row.prop(self, "exec_context", text='')
                 row.active = (item.idname != "")
+                row = layout.row(align=True)
+                row.prop(self, "space_type", text='')
+                row.prop(self, "mode", text='')
 
             draw_keymap_detail(self, context, base, item, draw_for_left_blank=draw_exec_context)
+            self.draw_prefix(context, base, key_items)
+            self.draw_macro(context, base, key_items)
+
+    def draw_macro(self, context:Context, layout:UILayout, key_items: dict[int, KeyMapItem]):
+        """ マクロの各ステップのオペレーターと設定、その追加/削除ボタンを描画する
+        """
+        box = layout.box()
+        box.label(text="マクロ (続けて実行するオペレーター)")
+        for i, step in enumerate(self.macro):
+            kmi = key_items.get(step.idx)
+            if kmi is None:
+                continue
+            col = box.column()
+            row = col.split(factor=0.9)
+            inner = row.split(factor=0.6)
+            inner.prop(kmi, "idname", text="")
+            inner.prop(step, "exec_context", text="")
+            op = row.operator(WM_OT_keyitem_manipulate.bl_idname, text="", icon='X')
+            op.method = "remove_macro"
+            op.index = i
+            if kmi.name != "":
+                col.template_keymap_item_properties(kmi)
+        op = box.split(factor=0.3).operator(WM_OT_keyitem_manipulate.bl_idname, text='Add Step', icon='ADD')
+        op.method = "add_macro"
+
+    def draw_prefix(self, context:Context, layout:UILayout, key_items: dict[int, KeyMapItem]):
+        """ 前置キーの一覧と、その追加/削除ボタンを描画する
+        """
+        box = layout.box()
+        row = box.split(factor=0.7)
+        row.label(text="前置キー")
+        row.prop(self, "timeout")
+        for i, step in enumerate(self.prefix):
+            kmi = key_items.get(step.idx)
+            if kmi is None:
+                continue
+            row = box.split(factor=0.9)
+            draw_key_input(self, context, row, kmi, direction="horizontal", excludes=["shift_ui", "key_modifier"])
+            op = row.operator(WM_OT_keyitem_manipulate.bl_idname, text="", icon='X')
+            op.method = "remove_step"
+            op.index = i
+        op = box.split(factor=0.3).operator(WM_OT_keyitem_manipulate.bl_idname, text='Add Key', icon='ADD')
+        op.method = "add_step"
 
 
 # ----- operator ---------------------
 class WM_OT_keyitem_manipulate(bpy.types.Operator):
     """ OperatorItem  の追加/削除を行う
 
-    method (str): 行う処理. add_item | remove_item | reset_items
+    method (str): 行う処理. add_item | remove_item | reset_items | add_step | remove_step | add_macro | remove_macro
+    index (int): remove_step / remove_macro で削除する前置キー / マクロのステップの位置
     """
     bl_idname = "wm.keyitem_manipulate"
     bl_label = "Manipulate Key Map Item"
 
     method : StringProperty(name="Manipulation method", default="")	
+    index : IntProperty(name="Index", default=-1)
 
     @classmethod
     def description(cls, context, properties):
         if properties.method == "reset_items": return "Reset oprators"
         elif properties.method == "add_item": return "Add new operator"
         elif properties.method == "remove_item": return "Remove this key's operator"
+        elif properties.method == "add_step": return "Add a key before this key"
+        elif properties.method == "remove_step": return "Remove this key"
+        elif properties.method == "add_macro": return "Add an operator to run after this one"
+        elif properties.method == "remove_macro": return "Remove this operator from the macro"
 
 
     def execute(self, context):
@@ -368,25 +1867,169 @@ class WM_OT_keyitem_manipulate(bpy.types.Operator):
             keyitem = key_items.new('', "A", "PRESS")
             group_item = context.addon_pref.op_items.add()
             group_item.idx = keyitem.id
+            group_item.profile = context.addon_pref.active_profile
+            context.addon_pref.active_item_index = len(context.addon_pref.op_items) - 1
             
         elif self.method == "remove_item":
             group_item = context.group_item
             op_items = context.addon_pref.op_items
-            i = list(op_items).index(group_item)
+            i = chord_index.position_of(context, group_item.idx)
+            if i < 0:
+                return {'CANCELLED'}
+            ids = group_item.key_item_ids()
             op_items.remove(i)
+            context.addon_pref.active_item_index = min(i, len(op_items) - 1)
 
-            keyitem = key_items.from_id(group_item.idx)
-            key_items.remove(keyitem)
+            for idx in ids:
+                keyitem = key_items.from_id(idx)
+                if keyitem:
+                    key_items.remove(keyitem)
         
         elif self.method == "reset_items":
             reset_groups(context)
+
+        elif self.method == "add_step":
+            group_item = context.group_item
+            keyitem = key_items.new('', "A", "PRESS")
+            step = group_item.prefix.add()
+            step.idx = keyitem.id
+
+        elif self.method == "remove_step":
+            group_item = context.group_item
+            if not (0 <= self.index < len(group_item.prefix)):
+                return {'CANCELLED'}
+            keyitem = key_items.from_id(group_item.prefix[self.index].idx)
+            if keyitem:
+                key_items.remove(keyitem)
+            group_item.prefix.remove(self.index)
+
+        elif self.method == "add_macro":
+            group_item = context.group_item
+            keyitem = key_items.new('', 'NONE', "PRESS")
+            step = group_item.macro.add()
+            step.idx = keyitem.id
+
+        elif self.method == "remove_macro":
+            group_item = context.group_item
+            if not (0 <= self.index < len(group_item.macro)):
+                return {'CANCELLED'}
+            keyitem = key_items.from_id(group_item.macro[self.index].idx)
+            if keyitem:
+                key_items.remove(keyitem)
+            group_item.macro.remove(self.index)
+        chord_index.mark_dirty()
+        return {'FINISHED'}
+
+
+def swap_items(collection: Any, a: int, b: int) -> None:
+    """ CollectionProperty の a 番目と b 番目 (a < b) の要素を入れ替える. 間の要素の位置は変わらない
+
+    collection (bpy_prop_collection) : CollectionProperty
+    a (int) : 前の要素の位置
+    b (int) : 後ろの要素の位置
+    """
+    collection.move(b, a)
+    collection.move(a + 1, b)
+
+
+class WM_OT_keyitem_bulk(bpy.types.Operator):
+    """ 選択されている OperatorItem をまとめて操作する
+
+    action (enum): 行う処理. REMOVE | DUPLICATE | MOVE_UP | MOVE_DOWN | ENABLE | DISABLE | SELECT_ALL | DESELECT_ALL
+    """
+    bl_idname = "wm.keyitem_bulk"
+    bl_label = "Edit Selected Key Items"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    action: EnumProperty(
+        name="Action",
+        items=[
+            ('REMOVE', "Remove", "Remove the selected items"),
+            ('DUPLICATE', "Duplicate", "Duplicate the selected items"),
+            ('MOVE_UP', "Move Up", "Move the selected items up"),
+            ('MOVE_DOWN', "Move Down", "Move the selected items down"),
+            ('ENABLE', "Enable", "Enable the selected items"),
+            ('DISABLE', "Disable", "Disable the selected items"),
+            ('SELECT_ALL', "Select All", "Select all items"),
+            ('DESELECT_ALL', "Deselect All", "Deselect all items"),
+        ],
+        default='REMOVE'
+    )
+
+    @classmethod
+    def description(cls, context, properties):
+        return cls.bl_rna.properties['action'].enum_items[properties.action].description
+
+    def execute(self, context):
+        keymap = context.window_manager.keyconfigs.addon.keymaps.find(__name__)
+        if not keymap:
+            return {'CANCELLED'}
+        prefs = context.preferences.addons[__name__].preferences
+        op_items = prefs.op_items
+        key_items = keymap.keymap_items
+        kmi_by_id = {kmi.id: kmi for kmi in key_items}
+        # 一覧に表示されている、使用中のプロファイルのものだけを対象にする
+        profile = prefs.active_profile
+        selected = [i for i, item in enumerate(op_items) if item.select and item.profile == profile]
+
+        if self.action in {'SELECT_ALL', 'DESELECT_ALL'}:
+            for item in op_items:
+                if item.profile == profile:
+                    item.select = (self.action == 'SELECT_ALL')
+            return {'FINISHED'}
+        if not selected:
+            return {'CANCELLED'}
+
+        if self.action == 'REMOVE':
+            for i in reversed(selected):
+                item = op_items[i]
+                ids = item.key_item_ids()
+                op_items.remove(i)
+                for idx in ids:
+                    kmi = kmi_by_id.pop(idx, None)
+                    if kmi:
+                        key_items.remove(kmi)
+            prefs.active_item_index = min(prefs.active_item_index, len(op_items) - 1)
+
+        elif self.action == 'DUPLICATE':
+            records = [item_to_record(op_items[i], kmi_by_id) for i in selected]
+            for i in selected:
+                op_items[i].select = False
+            start = len(op_items)
+            create_items(prefs, key_items, [r for r in records if r is not None])
+            for item in op_items[start:]:
+                item.select = True
+
+        elif self.action in {'MOVE_UP', 'MOVE_DOWN'}:
+            # 同じプロファイルの前後の項目と入れ替え、他のプロファイルの項目の並びは変えない
+            positions = [i for i, item in enumerate(op_items) if item.profile == profile]
+            rank_of = {i: r for r, i in enumerate(positions)}
+            ranks = [rank_of[i] for i in selected]
+            if self.action == 'MOVE_UP':
+                for n, r in enumerate(ranks):
+                    if r > n:
+                        swap_items(op_items, positions[r - 1], positions[r])
+            else:
+                last = len(positions) - 1
+                for n, r in enumerate(reversed(ranks)):
+                    if r < last - n:
+                        swap_items(op_items, positions[r], positions[r + 1])
+
+        elif self.action in {'ENABLE', 'DISABLE'}:
+            active = (self.action == 'ENABLE')
+            for i in selected:
+                kmi = kmi_by_id.get(op_items[i].idx)
+                if kmi:
+                    kmi.active = active
+
+        chord_index.mark_dirty()
         return {'FINISHED'}
 
 
 class WM_OT_three_keys_operator(bpy.types.Operator):
     """ モーダルモードでキー入力を監視し、入力に対応するオペレーターを実行する
 
-    handle: draw handler を格納するためのもの
+    handle: draw handler とそれを登録した Space クラスの組を格納するためのもの
     """
     bl_idname = "wm.three_keys_operator"
     bl_label = "Operator called by 3 keys"
@@ -394,123 +2037,682 @@ class WM_OT_three_keys_operator(bpy.types.Operator):
 
     handle = None
 
+    @classmethod
+    def poll(cls, context):
+        return context.area is not None and context.area.type in SPACE_CLASSES
+
     def __init__(self):
         """
         handle : handler
         main_kmi : このオペレーターが登録された KeyMapItem
-        name_dict: {str: {"op_item": OperatorItem, "key_item": bpy.types.KeyMapItem}}:
-            OperatorItem に登録されているキー入力とそれに対応する KeyMapItem の辞書
+        space_type (str): モーダルモードを開始したエディターの種類
+        session (ChordSession): キー入力の状態機械. invoke で作成する
+        dispatched (bool): 連続入力モードで、オペレーターを1つ以上実行したか
+        timer: タイムアウト判定のための event timer
+        t_invoke (float): invoke が呼ばれた時刻 (time.perf_counter 基準)
+        recording (list[list[Any]] | None): 記録中のイベント. 記録しない場合は None
+        recording_path (str): イベントの記録の書き出し先
+        recording_header (dict[str, Any]): イベントの記録のヘッダー
+        font_size (tuple[int, int]): 表示に使うフォントのサイズと DPI. invoke で設定する
+        line_height (float): 表示の1行の高さ (px). invoke で設定する
+        max_lines (int): 表示できる最大の行数. invoke で設定する
+        draw_list (list[tuple[float, float, str, bool]]): 表示する文字列とその位置 (x, y, text, 実行できるか) のリスト
         """
         self.handle = None
         self.main_kmi: Union[KeyMapItem, None] = None
-        self.name_dict: Union[dict[str,dict[str,Union[OperatorItem, KeyMapItem]]], None] = None
+        self.space_type = 'VIEW_3D'
+        self.session: Optional[ChordSession] = None
+        self.dispatched = False
+        self.timer = None
+        self.t_invoke = 0.0
+        self.recording: Optional[list[list[Any]]] = None
+        self.recording_path = ""
+        self.recording_header: dict[str, Any] = {}
+        self.font_size = (11, 72)
+        self.line_height = 16.0
+        self.max_lines = 0
+        self.draw_list: list[tuple[float, float, str, bool]] = []
 
 
     def my_callback(self, context):
-        """ モーダルモードであることを示す表示を描画するためのカスタムの draw 関数
+        """ 入力済みのキーと、次に入力できるキーの一覧を描画するためのカスタムの draw 関数
+        表示内容は layout_overlay() で作成済みのものを使い、ここでは描画のみを行う
         """
-        if (context.area.type == 'VIEW_3D' and context.region.type == 'WINDOW'):
-            U = context.preferences
-            dpi = U.system.dpi
+        if (context.area.type == self.space_type and context.region.type == 'WINDOW'):
             font_id = 0
-            theme_style = U.ui_styles[0]
-            blf.color(font_id, 1.0, 1.0, 1.0, 1.0)
-            blf.size(font_id, theme_style.widget.points, dpi)
-            blf.position(font_id, 25, 50, 0)
-            blf.draw(font_id, "Wait for input...")
+            blf.size(font_id, *self.font_size)
+            for x, y, text, available in self.draw_list:
+                if available:
+                    blf.color(font_id, 1.0, 1.0, 1.0, 1.0)
+                else:
+                    blf.color(font_id, 0.5, 0.5, 0.5, 0.6)
+                blf.position(font_id, x, y, 0)
+                blf.draw(font_id, text)
+
+
+    def setup_overlay(self, context):
+        """ 表示に使うフォントのサイズ・行の高さ・最大の行数を設定する
+        """
+        U = context.preferences
+        dpi = U.system.dpi
+        points = U.ui_styles[0].widget.points
+        self.font_size = (points, dpi)
+        self.line_height = points * dpi / 72 * 1.5
+        self.max_lines = max(1, int((context.region.height - 100) / self.line_height))
+
+
+    def layout_overlay(self):
+        """ 現在の節に対応する表示内容 (draw_list) を作成する
+        行数が max_lines を超える場合は、超えた分を1行にまとめる. 現在のコンテキストで実行できないものは暗く表示する
+        """
+        x, y = 25, 50
+        draw_list = [(x, y, " → ".join(self.session.path) + "  Wait for input...", True)]
+        lines = self.session.node.menu_lines()
+        if len(lines) > self.max_lines:
+            rest = len(lines) - self.max_lines + 1
+            lines = lines[:self.max_lines - 1] + [(f"... and {rest} more", None)]
+        for i, (text, entry) in enumerate(reversed(lines)):
+            available = entry is None or poll_cache.available(entry)
+            draw_list.append((x + 16, y + self.line_height * (i + 1), text, available))
+        self.draw_list = draw_list
 
 
     def draw_handler_add(self, context):
         if WM_OT_three_keys_operator.handle is None:
-            WM_OT_three_keys_operator.handle = bpy.types.SpaceView3D.draw_handler_add(
+            space_cls = SPACE_CLASSES[self.space_type]
+            handle = space_cls.draw_handler_add(
                 WM_OT_three_keys_operator.my_callback, (self, context), 'WINDOW', 'POST_PIXEL'
             )
+            WM_OT_three_keys_operator.handle = (space_cls, handle)
 
 
     def draw_handler_remove(self, context):
         if WM_OT_three_keys_operator.handle is not None:
-            bpy.types.SpaceView3D.draw_handler_remove(
-                WM_OT_three_keys_operator.handle, 'WINDOW'
-            )
+            space_cls, handle = WM_OT_three_keys_operator.handle
+            space_cls.draw_handler_remove(handle, 'WINDOW')
             WM_OT_three_keys_operator.handle = None
             context.region.tag_redraw()
 
 
-    def modal(self, context, event):
-        if event.value == "RELEASE":
-            self.draw_handler_remove(context)
-            return {'CANCELLED'}
-        elif event.value == "PRESS" and event.type == self.main_kmi.type:
-            return {'RUNNING_MODAL'}
-        elif event.value not in ["PRESS", "CLICK", "DOUBLE_CLICK", "CLICK_DRAG"]:
-            return {'RUNNING_MODAL'}
-        
-        key_item = op_item = None
+    def finish(self, context):
+        """ モーダルモードの終了処理. イベントを記録していれば、ファイルに書き出す
+        """
+        self.draw_handler_remove(context)
+        if self.timer is not None:
+            context.window_manager.event_timer_remove(self.timer)
+            self.timer = None
+        if self.recording is not None:
+            write_recording(self.recording_path, self.recording_header, self.recording)
+            self.recording = None
 
-        anyed = "[Any] "+ event.type
-        if anyed in self.name_dict:
-            key_item = self.name_dict[anyed]["key_item"]
-            op_item = self.name_dict[anyed]["op_item"]
 
-        event_str = event_to_string(event)
-        if key_item == None and event_str in self.name_dict:
-            key_item = self.name_dict[event_str]["key_item"]
-            op_item = self.name_dict[event_str]["op_item"]
+    def restart(self, context):
+        """ 連続入力モードで、トライ木の根に戻って次の入力を待つ
+        """
+        self.session.restart(time.perf_counter())
+        poll_cache.update(context)
+        self.layout_overlay()
+        context.region.tag_redraw()
+        return {'RUNNING_MODAL'}
 
-        if key_item == None or op_item == None:
-            self.draw_handler_remove(context)
-            return {'CANCELLED'}
+
+    def end_session(self, context):
+        """ モーダルモードを終了する. 連続入力モードで1つ以上実行していれば、それらを1回の undo にまとめる
+        """
+        self.finish(context)
+        return {'FINISHED'} if self.dispatched else {'CANCELLED'}
+
+
+    def dispatch(self, context, entry, t_start: Optional[float] = None):
+        """ entry のオペレーターを実行する
+        連続入力モードでは undo を積まずに実行し、モーダルモードを続けて根に戻る
+
+        t_start (float | None): キー入力を受け取った時刻. 処理時間の記録に使う
+        """
+        clock = time.perf_counter
+        t0 = clock()
+        if t_start is None:
+            t_start = t0
+        sticky = self.session.sticky
+        key_item = entry["key_item"]
+        operator = operator_resolver.resolve(key_item.idname)
+        t1 = clock()
+        latency.record("resolve", t1 - t0)
+        if not sticky:
+            self.finish(context)
+            latency.record("teardown", clock() - t1)
+        if operator == None or not poll_cache.available(entry):
+            self.report({'INFO'}, f"{entry['name']}: not available in this context")
+            return self.restart(context) if sticky else {'CANCELLED'}
+
+        if entry["macro"]:
+            retval = self.dispatch_macro(context, entry, t_start)
         else:
-            split = key_item.idname.split('.')
-            operator = None
-            if len(split) == 2:
-                m, o = split
-                if m in dir(bpy.ops):
-                    mod = getattr(bpy.ops, m)
-                    if o in dir(mod):
-                        operator = getattr(mod, o)
+            args = [entry["exec_context"], not sticky]
+            t1 = clock()
+            kwargs = chord_index.kwargs_for(entry)
+            t2 = clock()
+            latency.record("kwargs", t2 - t1)
+            retval = operator(*args, **kwargs)
+            t3 = clock()
+            latency.record("execute", t3 - t2)
+            latency.record("dispatch", t3 - t_start)
+            if 'RUNNING_MODAL' not in retval:
+                retval = {'FINISHED'}
+
+        if sticky:
+            if 'CANCELLED' not in retval:
+                self.dispatched = True
+            return self.restart(context)
+        return retval
+
+
+    def dispatch_macro(self, context, entry, t_start: float):
+        """ entry のオペレーターとマクロの各ステップを順に実行する
+        各ステップは undo を積まずに実行し、このオペレーターの終了時の1回の undo にまとめる
+        いずれかのステップが実行できなかった場合は、そこで中断する
+
+        t_start (float): キー入力を受け取った時刻. 処理時間の記録に使う
+        """
+        clock = time.perf_counter
+        timings = []
+        for step in [entry] + entry["macro"]:
+            t0 = clock()
+            idname = step["key_item"].idname
+            operator = operator_resolver.resolve(idname)
             if operator == None:
-                self.draw_handler_remove(context)
-                return {'CANCELLED'}
+                self.report({'WARNING'}, f"Unknown operator: {idname}")
+                break
+            kwargs = chord_index.kwargs_for(step)
+            try:
+                retval = operator(step["exec_context"], False, **kwargs)
+            except RuntimeError as e:
+                self.report({'WARNING'}, f"{idname}: {e}")
+                break
+            timings.append((idname, clock() - t0))
+            if 'CANCELLED' in retval:
+                break
+        t_end = clock()
+        latency.record("execute", sum(t for _, t in timings))
+        latency.record("dispatch", t_end - t_start)
+        if context.area:
+            context.area.tag_redraw()
+        if not timings:
+            return {'CANCELLED'}
+        self.report({'INFO'}, ", ".join(f"{name}: {t * 1000:.2f} ms" for name, t in timings))
+        return {'FINISHED'}
 
-            self.draw_handler_remove(context)
-            args = [op_item.exec_context, True]
-            kwargs = {}
-            for arg in dir(key_item.properties):
-                if not arg.startswith("_") and arg not in ["bl_rna", "rna_type"]:
-                    kwargs[arg] = getattr(key_item.properties, arg)
-            retval = operator(*args, **kwargs)
-            if 'RUNNING_MODAL' in retval:
-                return retval			
-            return {'FINISHED'}
+
+    def modal(self, context, event):
+        t_start = time.perf_counter()
+        if self.recording is not None:
+            self.recording.append(event_to_record(event, t_start - self.t_invoke))
+        action, entry = self.session.feed(event, t_start)
+        if action == ChordSession.REJECT:
+            latency.events["rejected"] += 1
+            return {'RUNNING_MODAL'}
+        latency.events["handled"] += 1
+        if action == ChordSession.IGNORE:
+            return {'RUNNING_MODAL'}
+
+        latency.record("lookup", time.perf_counter() - t_start)
+        if action == ChordSession.ADVANCE:
+            self.layout_overlay()
+            context.region.tag_redraw()
+            return {'RUNNING_MODAL'}
+        elif action == ChordSession.DISPATCH:
+            return self.dispatch(context, entry, t_start)
+        elif action == ChordSession.DISPATCH_END:
+            self.dispatch(context, entry, t_start)
+            return self.end_session(context)
+        elif action == ChordSession.RESTART:
+            return self.restart(context)
+        return self.end_session(context)
 
 
     def invoke(self, context, event):
-        context.window_manager.modal_handler_add(self)
-        self.draw_handler_add(context)
+        t_start = time.perf_counter()
         prefs:AddonPrefs = context.preferences.addons[__name__].preferences
         self.main_kmi = prefs._main_kmi
-        base_key = " ".join(key_to_string(self.main_kmi).split(" ")[:-1])
-
-        key_items = context.window_manager.keyconfigs.addon.keymaps[__name__].keymap_items
-        keyname_dict = {}
-        for item in prefs.op_items:
-            kmi = key_items.from_id(item.idx)
-            keyname_dict[f"{base_key} " + key_to_string(kmi)] =  { "op_item": item, "key_item": kmi}
-        self.name_dict = keyname_dict
+        root = chord_index.table_for(context)
+        if root is None:
+            return {'PASS_THROUGH'}
+        self.space_type = context.area.type
+        self.t_invoke = t_start
+        self.dispatched = False
+        self.session = ChordSession(
+            root, self.main_kmi.type, prefs.sticky_mode, chord_index.has_timeout, t_start
+        )
+        if prefs.record_events:
+            self.recording = []
+            self.recording_path = recording_path(prefs)
+            self.recording_header = {
+                "session": time.time(), "space_type": self.space_type, "mode": context.mode,
+                "trigger": self.main_kmi.type, "trigger_key": key_to_record(self.main_kmi),
+                "profile": chord_index.active_profile, "sticky": prefs.sticky_mode, "timer": chord_index.has_timeout,
+            }
+        context.window_manager.modal_handler_add(self)
+        self.draw_handler_add(context)
+        operator_resolver.validate(context)
+        poll_cache.begin(context)
+        self.setup_overlay(context)
+        self.layout_overlay()
+        if chord_index.has_timeout:
+            self.timer = context.window_manager.event_timer_add(0.05, window=context.window)
         context.region.tag_redraw()
+        latency.record("invoke", time.perf_counter() - t_start)
         return {'RUNNING_MODAL'}
 
 
+class WM_OT_profile_manipulate(bpy.types.Operator):
+    """ プロファイルの追加/削除を行う
+
+    method (str): 行う処理. add | remove
+    name (str): add で追加するプロファイル名
+    copy_items (bool): add で、使用中のプロファイルの OperatorItem を複製する
+    """
+    bl_idname = "wm.three_keys_profile_manipulate"
+    bl_label = "Manipulate Profile"
+
+    method: EnumProperty(
+        name="Method",
+        items=[
+            ('ADD', "Add", "Add a new profile and switch to it"),
+            ('REMOVE', "Remove", "Remove the active profile and its items"),
+        ],
+        default='ADD'
+    )
+    name: StringProperty(name="Name", default="Profile")
+    copy_items: BoolProperty(name="Copy Items", description="Start from a copy of the active profile", default=False)
+
+    @classmethod
+    def description(cls, context, properties):
+        return cls.bl_rna.properties['method'].enum_items[properties.method].description
+
+    def invoke(self, context, event):
+        if self.method == 'ADD':
+            return context.window_manager.invoke_props_dialog(self)
+        return self.execute(context)
+
+    def execute(self, context):
+        keymap = context.window_manager.keyconfigs.addon.keymaps.find(__name__)
+        if not keymap:
+            return {'CANCELLED'}
+        prefs = context.preferences.addons[__name__].preferences
+        op_items = prefs.op_items
+        key_items = keymap.keymap_items
+        active = prefs.active_profile
+
+        if self.method == 'ADD':
+            name = self.name.strip()
+            if name == "" or prefs.profiles.find(name) >= 0:
+                self.report({'WARNING'}, f"Profile already exists: {name}")
+                return {'CANCELLED'}
+            ensure_profile(prefs, name)
+            if self.copy_items:
+                kmi_by_id = {kmi.id: kmi for kmi in key_items}
+                records = [item_to_record(item, kmi_by_id) for item in op_items if item.profile == active]
+                records = [r for r in records if r is not None]
+                for record in records:
+                    record["profile"] = name
+                create_items(prefs, key_items, records)
+            prefs.active_profile = name
+
+        elif self.method == 'REMOVE':
+            if len(prefs.profiles) <= 1:
+                return {'CANCELLED'}
+            for i in reversed(range(len(op_items))):
+                if op_items[i].profile != active:
+                    continue
+                ids = op_items[i].key_item_ids()
+                op_items.remove(i)
+                for idx in ids:
+                    keyitem = key_items.from_id(idx)
+                    if keyitem:
+                        key_items.remove(keyitem)
+            prefs.profiles.remove(prefs.profiles.find(active))
+            prefs.active_profile = prefs.profiles[0].name
+            prefs.active_item_index = 0
+            chord_index.mark_dirty()
+
+        return {'FINISHED'}
+
+
+class WM_OT_conflicts_refresh(bpy.types.Operator):
+    """ 既存のショートカットとの重複を調べるための索引を作り直す
+    """
+    bl_idname = "wm.three_keys_conflicts_refresh"
+    bl_label = "Refresh Conflicts"
+    bl_description = "Re-scan the user and default keyconfigs for conflicting shortcuts"
+
+    def execute(self, context):
+        conflict_index.invalidate()
+        return {'FINISHED'}
+
+
+class WM_OT_latency_export(bpy.types.Operator, ExportHelper):
+    """ 処理時間の記録を JSON ファイルに書き出す
+    """
+    bl_idname = "wm.three_keys_latency_export"
+    bl_label = "Export Latency"
+    bl_description = "Export the key-press-to-operator latency to a JSON file"
+
+    filename_ext = ".json"
+    filter_glob: StringProperty(default="*.json", options={'HIDDEN'})
+
+    def execute(self, context):
+        data = {
+            "addon_version": list(bl_info["version"]),
+            "blender_version": list(bpy.app.version),
+            "buffer_size": latency.size,
+            "stages": latency.summary(with_samples=True),
+            "events": dict(latency.events),
+        }
+        with open(self.filepath, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=1)
+        self.report({'INFO'}, f"Exported: {self.filepath}")
+        return {'FINISHED'}
+
+
+class WM_OT_latency_clear(bpy.types.Operator):
+    """ 処理時間の記録を破棄する
+    """
+    bl_idname = "wm.three_keys_latency_clear"
+    bl_label = "Clear Latency"
+    bl_description = "Clear the recorded latency"
+
+    def execute(self, context):
+        latency.clear()
+        return {'FINISHED'}
+
+
+class WM_OT_events_replay(bpy.types.Operator, ImportHelper):
+    """ 記録したイベントを ChordSession に流し、キー入力の処理のスループットとイベントごとの処理時間を計測する
+    トライ木はアドオンのキーマップではなく、スナップショットまたは書き出したファイルの内容から作るため、
+    blender --background --python-expr "import bpy; bpy.ops.wm.three_keys_replay(filepath='events.jsonl')" でも実行できる
+    """
+    bl_idname = "wm.three_keys_replay"
+    bl_label = "Replay Events"
+    bl_description = "Replay recorded modal events through the chord dispatch and report its throughput"
+
+    filename_ext = ".jsonl"
+    filter_glob: StringProperty(default="*.jsonl", options={'HIDDEN'})
+    items_path: StringProperty(
+        name="Key Items",
+        description="Exported key items to build the chord tables from. The saved snapshot is used if empty",
+        subtype='FILE_PATH',
+        default=""
+    )
+    execute_operators: BoolProperty(
+        name="Execute Operators",
+        description="Run the dispatched operators too, instead of only resolving them and building their arguments",
+        default=False
+    )
+
+    def execute(self, context):
+        clock = time.perf_counter
+        items_path = bpy.path.abspath(self.items_path) if self.items_path != "" else snapshot_path()
+        try:
+            with open(self.filepath, encoding="utf-8") as f:
+                sessions, errors = read_recording(f)
+            with open(items_path, encoding="utf-8") as f:
+                items_header, records, item_errors = read_items(f)
+        except (OSError, UnicodeDecodeError) as e:
+            self.report({'ERROR'}, f"Failed to read: {e}")
+            return {'CANCELLED'}
+        if item_errors:
+            self.report({'ERROR'}, f"{items_path}: {item_errors[0]}")
+            return {'CANCELLED'}
+        if errors:
+            self.report({'WARNING'}, f"{len(errors)} unreadable lines skipped ({errors[0]})")
+        operator_resolver.validate(context)
+
+        # モーダルモード移行キーの補助キーによって表が変わるため、移行キーごとに作る
+        indexes: dict[str, ChordIndex] = {}
+        samples = array('d')
+        dispatches = 0
+        skipped = 0
+        for header, events, times in sessions:
+            trigger = header.get("trigger_key") or items_header.get("trigger") or {"type": header.get("trigger", "")}
+            if validate_key_record(trigger):
+                skipped += 1
+                continue
+            key = json.dumps(trigger, sort_keys=True)
+            index = indexes.get(key)
+            if index is None:
+                index = indexes[key] = records_to_index(trigger, records)
+            tables = index.profiles.get(header.get("profile", items_header.get("active_profile", DEFAULT_PROFILE)), {})
+            space_type = header.get("space_type")
+            root = tables.get((space_type, header.get("mode"))) or tables.get((space_type, 'ANY'))
+            if root is None:
+                skipped += 1
+                continue
+            session = ChordSession(root, header.get("trigger", ""), header.get("sticky", False),
+                                   header.get("timer", False), 0.0)
+            for event, t in zip(events, times):
+                t0 = clock()
+                action, entry = session.feed(event, t)
+                if entry is not None:
+                    operator = operator_resolver.resolve(entry["key_item"].idname)
+                    kwargs = index.kwargs_for(entry)
+                    if self.execute_operators and operator != None:
+                        try:
+                            operator(entry["exec_context"], False, **kwargs)
+                        except (RuntimeError, TypeError) as e:
+                            print(f"{__name__}: replay {entry['key_item'].idname}: {e}")
+                    dispatches += 1
+                # モーダルモードと同じく、連続入力モードでは実行後に根に戻り、それ以外では終了する
+                ended = action in (ChordSession.END, ChordSession.DISPATCH_END) \
+                    or (action == ChordSession.DISPATCH and not session.sticky)
+                if not ended and action in (ChordSession.DISPATCH, ChordSession.RESTART):
+                    session.restart(t)
+                samples.append(clock() - t0)
+                if ended:
+                    break
+
+        n = len(samples)
+        if n == 0:
+            self.report({'WARNING'}, f"No events replayed ({skipped} sessions skipped)")
+            return {'CANCELLED'}
+        total = sum(samples)
+        data = sorted(samples)
+        p50, p95, p99 = [data[min(n - 1, n * q // 100)] * 1e6 for q in (50, 95, 99)]
+        message = (f"{n} events / {len(sessions) - skipped} sessions, {dispatches} dispatches,"
+                   f" {n / total:.0f} events/s, p50 {p50:.1f} us, p95 {p95:.1f} us, p99 {p99:.1f} us")
+        if skipped:
+            message += f" ({skipped} sessions skipped)"
+        print(f"{__name__}: replay {message}")
+        self.report({'INFO'}, message)
+        return {'FINISHED'}
+
+
+class WM_OT_keyitems_export(bpy.types.Operator, ExportHelper):
+    """ OperatorItem とその KeyMapItem を JSON Lines 形式で書き出す
+    """
+    bl_idname = "wm.three_keys_items_export"
+    bl_label = "Export Key Items"
+    bl_description = "Export the key items to a JSON Lines file"
+
+    filename_ext = ".jsonl"
+    filter_glob: StringProperty(default="*.jsonl", options={'HIDDEN'})
+
+    def execute(self, context):
+        prefs = context.preferences.addons[__name__].preferences
+        with open(self.filepath, "w", encoding="utf-8") as f:
+            count = write_items(f, prefs, key_items_by_id(context))
+        self.report({'INFO'}, f"Exported {count} items: {self.filepath}")
+        return {'FINISHED'}
+
+
+class WM_OT_keyitems_import(bpy.types.Operator, ImportHelper):
+    """ JSON Lines 形式のファイルから OperatorItem とその KeyMapItem を読み込む
+    ファイル全体を検証してから、すべての項目をまとめて作成する
+
+    replace (bool): 既存の項目を削除してから読み込む
+    """
+    bl_idname = "wm.three_keys_items_import"
+    bl_label = "Import Key Items"
+    bl_description = "Import key items from a JSON Lines file"
+
+    filename_ext = ".jsonl"
+    filter_glob: StringProperty(default="*.jsonl", options={'HIDDEN'})
+    replace: BoolProperty(name="Replace Existing", default=False)
+
+    def execute(self, context):
+        try:
+            with open(self.filepath, encoding="utf-8") as f:
+                _header, records, errors = read_items(f)
+        except OSError as e:
+            self.report({'ERROR'}, str(e))
+            return {'CANCELLED'}
+        if errors:
+            for msg in errors[:10]:
+                self.report({'ERROR'}, msg)
+            return {'CANCELLED'}
+
+        keymaps = context.window_manager.keyconfigs.addon.keymaps
+        keymap = keymaps.find(__name__)
+        if not keymap:
+            return {'CANCELLED'}
+        prefs = context.preferences.addons[__name__].preferences
+        if self.replace:
+            prefs.op_items.clear()
+            keymaps.remove(keymap)
+            keymap = keymaps.new(__name__)
+        create_items(prefs, keymap.keymap_items, records)
+        if context.area:
+            context.area.tag_redraw()
+        self.report({'INFO'}, f"Imported {len(records)} items")
+        return {'FINISHED'}
+
+
+# ----- ui list ----------------------
+# AddonPrefs.draw の中で作成される {id: KeyMapItem}. 一覧の描画中は from_id の代わりにこれを使う
+drawn_key_items: dict[int, KeyMapItem] = {}
+
+
+def key_items_by_id(context: Context) -> dict[int, KeyMapItem]:
+    """ アドオンのキーマップの {id: KeyMapItem} を作成し、drawn_key_items に格納する
+
+    context (bpy.types.Context): context
+    """
+    global drawn_key_items
+    keymap = context.window_manager.keyconfigs.addon.keymaps.find(__name__)
+    drawn_key_items = {kmi.id: kmi for kmi in keymap.keymap_items} if keymap else {}
+    return drawn_key_items
+
+
+def sequence_to_string(item: "OperatorItem", key_items: dict[int, KeyMapItem]) -> str:
+    """ OperatorItem の前置キーと最後のキーを 'R → [Shift] X' のような文字列にする
+
+    item (OperatorItem): OperatorItem
+    key_items (dict[int, KeyMapItem]): {id: KeyMapItem}
+    """
+    kmis = [key_items.get(step.idx) for step in item.prefix] + [key_items.get(item.idx)]
+    return " → ".join(key_to_string(kmi) if kmi else "?" for kmi in kmis)
+
+
+class THREEKEYS_UL_op_items(bpy.types.UIList):
+    """ OperatorItem の一覧. 表示されている行のみ描画され、キーまたはオペレーター名での絞り込みと並べ替えができる
+
+    sort_by (enum): 並べ替えの基準. NONE | KEY | NAME
+    """
+    sort_by: EnumProperty(
+        name="Sort by",
+        items=[('NONE', "Default", ""), ('KEY', "Key", ""), ('NAME', "Operator", "")],
+        default='NONE'
+    )
+
+    def draw_item(self, context, layout, data, item, icon, active_data, active_propname, index):
+        kmi = drawn_key_items.get(item.idx)
+        layout.prop(item, "select", text="")
+        row = layout.split(factor=0.4)
+        # 直前のモーダルモードで poll() が通らなかったものも暗く表示する
+        row.active = kmi is not None and kmi.active and poll_cache.last.get(item.idx, True)
+        if item.idx in chord_index.conflicts:
+            row.alert = True
+            row.label(text=sequence_to_string(item, drawn_key_items), icon='ERROR')
+        else:
+            row.label(text=sequence_to_string(item, drawn_key_items))
+        right = row.split(factor=0.6)
+        if kmi is None or kmi.name == "":
+            right.label(text="未設定")
+        else:
+            right.label(text=kmi.name)
+        right.label(text=item.space_type if item.mode == 'ANY' else f"{item.space_type} / {item.mode}")
+
+    def draw_filter(self, context, layout):
+        row = layout.row(align=True)
+        row.prop(self, "filter_name", text="")
+        row.prop(self, "use_filter_invert", text="", icon='ARROW_LEFTRIGHT')
+        row = layout.row(align=True)
+        row.prop(self, "sort_by", expand=True)
+        row.prop(self, "use_filter_sort_reverse", text="", icon='SORT_DESC')
+
+    def filter_items(self, context, data, propname):
+        items = getattr(data, propname)
+        # 使用中のプロファイルのものだけを表示する
+        profile = data.active_profile
+        in_profile = [item.profile == profile for item in items]
+        if self.filter_name == "" and self.sort_by == 'NONE':
+            return [self.bitflag_filter_item if shown else 0 for shown in in_profile], []
+
+        texts = []
+        for item in items:
+            kmi = drawn_key_items.get(item.idx)
+            name = (kmi.name or kmi.idname) if kmi else ""
+            texts.append((sequence_to_string(item, drawn_key_items), name))
+
+        helper = bpy.types.UI_UL_list
+        flt_flags = [self.bitflag_filter_item if shown else 0 for shown in in_profile]
+        if self.filter_name != "":
+            pattern = self.filter_name.lower()
+            flt_flags = [
+                flag if pattern in key.lower() or pattern in name.lower() else 0
+                for flag, (key, name) in zip(flt_flags, texts)
+            ]
+
+        flt_neworder = []
+        if self.sort_by != 'NONE':
+            column = 0 if self.sort_by == 'KEY' else 1
+            flt_neworder = helper.sort_items_helper(list(enumerate(t[column] for t in texts)), key=lambda x: x[1].lower())
+        return flt_flags, flt_neworder
+
+
 # ----- preference --------------------
 class AddonPrefs(bpy.types.AddonPreferences):
     """ アドオン設定
 
-    mode_groups: OperatorItemGroup を要素とする CollectionProperty
+    op_items: OperatorItem を要素とする CollectionProperty
+    active_item_index (int): 一覧で選択されている OperatorItem の位置
+    sticky_mode (bool): 連続入力モード. 移行キーを離すか Esc を押すまで、続けてオペレーターを実行できる
+    record_events (bool): モーダルモード中のイベントを記録する. WM_OT_events_replay で再生できる
+    record_path (str): イベントの記録の書き出し先. 空の場合はユーザー設定のフォルダーの events.jsonl
+    profiles: ChordProfile を要素とする CollectionProperty
+    active_profile (str): 使用中のプロファイル名. 切り替えてもトライ木や KeyMapItem は作り直さない
     """
     bl_idname = __name__
 
     op_items: CollectionProperty( name='Items', type=OperatorItem)
+    active_item_index: IntProperty(name="Active Item", default=0)
+    sticky_mode: BoolProperty(
+        name="Sticky Mode",
+        description="Keep waiting for keys after running an operator, until the trigger key is released or Esc is pressed",
+        default=False
+    )
+    record_events: BoolProperty(
+        name="Record Events",
+        description="Append the events received in the modal mode to a JSON Lines file for replaying",
+        default=False
+    )
+    record_path: StringProperty(
+        name="Record File",
+        description="File the recorded events are appended to. Empty for events.jsonl in the user config folder",
+        subtype='FILE_PATH',
+        default=""
+    )
+    profiles: CollectionProperty(name='Profiles', type=ChordProfile)
+    active_profile: StringProperty(name="Profile", default=DEFAULT_PROFILE, update=profile_update)
     _main_kmi = None
 
     def draw(self, context):
@@ -523,55 +2725,169 @@ class AddonPrefs(bpy.types.AddonPreferences):
             custom_label= lambda name: "モーダルモード移行キー", show_remove_func=False
         )
         draw_key_input(self, context, layout.box(), item, direction="horizontal")
+        layout.prop(self, "sticky_mode")
+        self.draw_trigger_conflicts(context, layout)
 
         layout.separator()
         row = layout.split(factor=0.7)
         [R_label, R_resetbutton] = [row.row() for i in range(2)]
         R_label.label(text="キー設定")
+        R_resetbutton.operator(WM_OT_keyitems_import.bl_idname, text='', icon='IMPORT')
+        R_resetbutton.operator(WM_OT_keyitems_export.bl_idname, text='', icon='EXPORT')
         resetbutton = R_resetbutton.operator(WM_OT_keyitem_manipulate.bl_idname, text='Reset', icon='SHADERFX')
         resetbutton.method = "reset_items"
 
-        for item in self.op_items:
-            row = layout.row()
-            item.draw(context, row)
+        row = layout.row(align=True)
+        row.prop_search(self, "active_profile", self, "profiles", text="", icon='PRESET')
+        row.operator(WM_OT_profile_manipulate.bl_idname, text="", icon='ADD').method = 'ADD'
+        row.operator(WM_OT_profile_manipulate.bl_idname, text="", icon='REMOVE').method = 'REMOVE'
+
+        key_items = key_items_by_id(context)
+        chord_index.ensure(context)
+        layout.template_list(
+            THREEKEYS_UL_op_items.__name__, "", self, "op_items", self, "active_item_index", rows=8
+        )
+        row = layout.row(align=True)
+        for action, icon in [
+            ('SELECT_ALL', 'CHECKBOX_HLT'), ('DESELECT_ALL', 'CHECKBOX_DEHLT'),
+            ('MOVE_UP', 'TRIA_UP'), ('MOVE_DOWN', 'TRIA_DOWN'),
+            ('ENABLE', 'HIDE_OFF'), ('DISABLE', 'HIDE_ON'),
+            ('DUPLICATE', 'DUPLICATE'), ('REMOVE', 'X'),
+        ]:
+            row.operator(WM_OT_keyitem_bulk.bl_idname, text="", icon=icon).action = action
+        if 0 <= self.active_item_index < len(self.op_items):
+            active_item = self.op_items[self.active_item_index]
+            active_item.draw(context, layout.row(), key_items)
+            chord_index.watch_properties([key_items[i] for i in active_item.key_item_ids() if i in key_items])
 
         addbutton = layout.split(factor=0.3).operator(WM_OT_keyitem_manipulate.bl_idname, text='Add New', icon='ADD')
         addbutton.method = 'add_item'
 
+        layout.separator()
+        self.draw_latency(context, layout)
+        if startup_stats:
+            layout.label(
+                text=f"起動時の復元: {startup_stats['items']} 件 ({startup_stats['source']}),"
+                     f" {startup_stats['seconds'] * 1000:.1f} ms",
+                icon='TIME'
+            )
+
+    def draw_trigger_conflicts(self, context, layout: UILayout):
+        """ 各エディターに登録したモーダルモード移行キーと重なる既存のショートカットを表示する
+        """
+        conflict_index.ensure(context)
+        # どのエディターでも有効なキーマップの重複は、エディターごとに見つかるので1つにまとめる
+        hits = list(dict.fromkeys(
+            hit for keymap, item in addon_keymaps for hit in conflict_index.find(keymap.name, item)
+        ))
+        row = layout.row()
+        if hits:
+            col = row.column()
+            col.alert = True
+            for kc_name, km_name, name, _value in hits:
+                col.label(text=f"{kc_name} / {km_name}: {name}", icon='ERROR')
+        else:
+            row.label(text="重複なし", icon='CHECKMARK')
+        row.operator(WM_OT_conflicts_refresh.bl_idname, text="", icon='FILE_REFRESH')
+
+    def draw_latency(self, context, layout: UILayout):
+        """ 処理時間の p50/p95/p99 を表示する
+        """
+        row = layout.split(factor=0.6)
+        [R_label, R_buttons] = [row.row() for i in range(2)]
+        R_label.label(text="処理時間 (ms)")
+        R_buttons.operator(WM_OT_latency_export.bl_idname, text='Export', icon='EXPORT')
+        R_buttons.operator(WM_OT_latency_clear.bl_idname, text='Clear', icon='TRASH')
+
+        box = layout.box()
+        grid = box.grid_flow(row_major=True, columns=5, even_columns=True, align=True)
+        for text in ["", "count", "p50", "p95", "p99"]:
+            grid.label(text=text)
+        for stage, data in latency.summary().items():
+            grid.label(text=stage)
+            grid.label(text=str(data["count"]))
+            for q in (50, 95, 99):
+                value = data.get(f"p{q}_ms")
+                grid.label(text="-" if value is None else f"{value:.3f}")
+        box.label(text=f"イベント: 処理 {latency.events['handled']} / 無視 {latency.events['rejected']}")
+
+        row = layout.row()
+        row.prop(self, "record_events")
+        sub = row.row()
+        sub.active = self.record_events
+        sub.prop(self, "record_path", text="")
+        row.operator(WM_OT_events_replay.bl_idname, text='Replay', icon='PLAY')
+
 
 #---------------------------------------
 
 classes = [
      WM_OT_three_keys_operator,
     WM_OT_keyitem_manipulate,
+    WM_OT_keyitem_bulk,
+    WM_OT_profile_manipulate,
+    WM_OT_conflicts_refresh,
+    WM_OT_latency_export,
+    WM_OT_latency_clear,
+    WM_OT_events_replay,
+    WM_OT_keyitems_export,
+    WM_OT_keyitems_import,
+    ChordProfile,
+    ChordStep,
+    MacroStep,
     OperatorItem,
+    THREEKEYS_UL_op_items,
     AddonPrefs
 ]
 
 
 addon_keymaps = []
+msgbus_owner = object()
+
+# {space_type: Space クラス}. オーバーレイの draw handler の登録先
+SPACE_CLASSES = {space: getattr(bpy.types, cls) for space, _km, _label, cls in CHORD_SPACES}
+
+
+@bpy.app.handlers.persistent
+def load_handler(dummy):
+    # キー設定は変わっていないので、スナップショットの保存は予約しない
+    chord_index.dirty = True
+    operator_resolver.invalidate()
+
 
 def register():
     for cls in classes:
         bpy.utils.register_class(cls)
     kc = bpy.context.window_manager.keyconfigs.addon
     if kc:
-        km = kc.keymaps.new('3D View', space_type='VIEW_3D', region_type='WINDOW', modal=False)
-        kmi = km.keymap_items.new(WM_OT_three_keys_operator.bl_idname, 'Q', 'PRESS', shift=1, head=True)
-        addon_keymaps.append((km, kmi))
-        AddonPrefs._main_kmi = kmi
-    reset_groups(bpy.context)	
+        for space_type, km_name, _label, _cls in CHORD_SPACES:
+            km = kc.keymaps.new(km_name, space_type=space_type, region_type='WINDOW', modal=False)
+            kmi = km.keymap_items.new(WM_OT_three_keys_operator.bl_idname, 'Q', 'PRESS', shift=1, head=True)
+            addon_keymaps.append((km, kmi))
+        AddonPrefs._main_kmi = addon_keymaps[0][1]
+        # --background モードでは keyconfigs.addon が無く、キー設定を置く場所が無い
+        restore_or_reset(bpy.context)
+    subscribe_keymap_changes(msgbus_owner)
+    bpy.app.handlers.load_post.append(load_handler)
 
 
 def unregister():
+    if bpy.app.timers.is_registered(save_snapshot):
+        bpy.app.timers.unregister(save_snapshot)
+    save_snapshot()
+    bpy.msgbus.clear_by_owner(msgbus_owner)
+    chord_index.dirty = True
+    if load_handler in bpy.app.handlers.load_post:
+        bpy.app.handlers.load_post.remove(load_handler)
     for cls in classes:
         bpy.utils.unregister_class(cls)
     for km, kmi in addon_keymaps:
         km.keymap_items.remove(kmi)
     addon_keymaps.clear()
-    keymap = bpy.context.window_manager.keyconfigs.addon.keymaps.find(__name__)
+    kc = bpy.context.window_manager.keyconfigs.addon
+    keymap = kc.keymaps.find(__name__) if kc else None
     if keymap:
-        bpy.context.window_manager.keyconfigs.addon.keymaps.remove(keymap)
+        kc.keymaps.remove(keymap)
 
 
 if __name__ == "__main__":
@@ -1,6 +1,11 @@
 import bpy
 from bpy.props import *
+import heapq
+import math
+import re
+import time
 
+from typing import Any, Optional
 from bpy.types import Context, UILayout
 
 
@@ -31,25 +36,391 @@ def indented_layout( context: Context, layout: UILayout, level = 0, indent_width
 
 
 # ----- functions -----------------
+# 検索結果として返す最大の件数
+SEARCH_LIMIT = 100
+
+# 単語の区切りとみなす文字
+TOKEN_SEPARATOR = re.compile(r"[._\s]+")
+
+# トライ木に登録する単語の先頭の文字数. これより長い入力は trigram で探す
+TRIE_DEPTH = 2
+
+# 入力の単語の trigram のうち、一致とみなすのに必要な共通の trigram の割合. 1 未満にすると綴りの誤りも拾う
+FUZZY_MATCH_RATIO = 0.5
+
+
+def trigrams_of(text: str) -> set[str]:
+    """ 文字列に含まれる連続した3文字の集合を返す
+
+    text (str): 文字列
+    """
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class TrieNode:
+    """ SearchIndex のトライ木の節
+
+    children (dict[str, TrieNode]): {次の1文字: 次の節}
+    ids (set[int]): この節までの文字列で始まる単語を持つ項目の id
+    top (list[str] | None): この節までの文字列を入力したときの検索結果. 項目の追加で None に戻る
+    """
+    __slots__ = ("children", "ids", "top")
+
+    def __init__(self):
+        self.children: dict[str, TrieNode] = {}
+        self.ids: set[int] = set()
+        self.top: Optional[list[str]] = None
+
+
+class SearchIndex:
+    """ オペレーター名とラベルの検索のための索引
+    TRIE_DEPTH 文字以下の1単語の入力は単語の前方一致 (トライ木) で、節ごとに順位付け済みの結果を返す
+    それ以外は入力を単語に分け、単語ごとに共通の trigram の数で候補を求め、すべての単語に一致したものを heapq で順位付けする
+    直前の入力の単語を延長した単語では、直前の trigram の数に増えた trigram の分だけを足す
+
+    names (list[str]): 'module.op' 形式のオペレーター名. 位置が項目の id になる
+    texts (list[str]): 検索対象の小文字の文字列 ('module.op ラベル')
+    trie (TrieNode): 単語の先頭 TRIE_DEPTH 文字の前方一致のためのトライ木
+    trigrams (dict[str, set[int]]): {3文字: それを含む項目の id の集合}
+    last_counts (dict[str, dict[int, int]]): 直前の入力の {単語: {項目の id: 共通の trigram の数}}. 索引が変わったときは空
+    """
+    def __init__(self):
+        self.names: list[str] = []
+        self.texts: list[str] = []
+        self.trie = TrieNode()
+        self.trigrams: dict[str, set[int]] = {}
+        self.last_counts: dict[str, dict[int, int]] = {}
+
+    def add(self, name: str, label: str) -> None:
+        """ 項目を1つ追加する
+
+        name (str): 'module.op' 形式のオペレーター名
+        label (str): オペレーターのラベル
+        """
+        i = len(self.names)
+        text = f"{name} {label}".lower()
+        self.names.append(name)
+        self.texts.append(text)
+        for token in set(TOKEN_SEPARATOR.split(text)):
+            node = self.trie
+            for c in token[:TRIE_DEPTH]:
+                node = node.children.setdefault(c, TrieNode())
+                node.ids.add(i)
+                node.top = None
+        for gram in trigrams_of(text):
+            self.trigrams.setdefault(gram, set()).add(i)
+        self.last_counts = {}
+
+    def prefix_nodes(self) -> list[tuple[str, TrieNode]]:
+        """ トライ木のすべての節を、その節までの文字列と組にして返す
+        """
+        found = []
+        stack = [("", self.trie)]
+        while stack:
+            prefix, node = stack.pop()
+            for c, child in node.children.items():
+                found.append((prefix + c, child))
+                stack.append((prefix + c, child))
+        return found
+
+    def rank(self, prefix: str, node: TrieNode) -> list[str]:
+        """ 節の項目を順位付けした上位 SEARCH_LIMIT 件を node.top に保持し、それを返す
+
+        prefix (str): 節までの文字列
+        node (TrieNode): トライ木の節
+        """
+        best = heapq.nlargest(SEARCH_LIMIT, node.ids, key=lambda i: self.score(i, prefix))
+        node.top = [self.names[i] for i in best]
+        return node.top
+
+    def finalize(self) -> None:
+        """ トライ木のすべての節の検索結果を求めておく. 短い入力の検索は、以降は結果を返すだけになる
+        """
+        for prefix, node in self.prefix_nodes():
+            if node.top is None:
+                self.rank(prefix, node)
+
+    def token_matches(self, token: str, counts_cache: dict[str, dict[int, int]]) -> dict[int, float]:
+        """ 入力の1単語に一致する項目を {項目の id: 一致の度合い (0-1)} で返す
+        trigram を持たない短い単語は単語の前方一致で、それ以外は共通の trigram が FUZZY_MATCH_RATIO 以上のものを返す
+
+        token (str): 小文字の入力の1単語
+        counts_cache (dict[str, dict[int, int]]): 求めた共通の trigram の数を {単語: {項目の id: 数}} として追加する
+        """
+        grams = trigrams_of(token)
+        if not grams:
+            node = self.trie
+            for c in token[:TRIE_DEPTH]:
+                node = node.children.get(c)
+                if node is None:
+                    return {}
+            return dict.fromkeys(node.ids, 1.0)
+        counts = None
+        new_grams = grams
+        # 直前の入力の単語を延長した単語なら、増えた trigram の分だけを数える
+        for old in sorted(self.last_counts, key=len, reverse=True):
+            if token.startswith(old) and len(old) >= 3:
+                counts = self.last_counts[old].copy()
+                new_grams = grams - trigrams_of(old)
+                break
+        if counts is None:
+            counts = {}
+        for gram in new_grams:
+            for i in self.trigrams.get(gram, ()):
+                counts[i] = counts.get(i, 0) + 1
+        counts_cache[token] = counts
+        need = max(1, math.ceil(len(grams) * FUZZY_MATCH_RATIO))
+        return {i: n / len(grams) for i, n in counts.items() if n >= need}
+
+    def candidates(self, query: str) -> dict[int, float]:
+        """ query のすべての単語に一致する項目を {項目の id: 単語ごとの一致の度合いの平均} で返す
+        単語を含まない入力 (区切り文字のみ) では、その文字列を含む項目を返す
+
+        query (str): 小文字の入力
+        """
+        tokens = [token for token in TOKEN_SEPARATOR.split(query) if token != ""]
+        if not tokens:
+            return {i: 1.0 for i, text in enumerate(self.texts) if query in text}
+        counts_cache: dict[str, dict[int, int]] = {}
+        matches: Optional[dict[int, float]] = None
+        for token in tokens:
+            found = self.token_matches(token, counts_cache)
+            if matches is None:
+                matches = found
+            else:
+                matches = {i: r + found[i] for i, r in matches.items() if i in found}
+            if not matches:
+                break
+        self.last_counts = counts_cache
+        return {i: r / len(tokens) for i, r in matches.items()}
+
+    def score(self, i: int, query: str, fuzzy: float = 0.0) -> float:
+        """ 項目の並び順の評価値を返す. 完全一致 > 前方一致 > 単語の前方一致 > 部分一致 > 単語ごとの一致
+        同じ段階のものは、一致した位置が前のもの・名前が短いものを優先する
+
+        i (int): 項目の id
+        query (str): 小文字の入力
+        fuzzy (float): query が部分一致しない場合に使う、candidates() の一致の度合い. デフォルト 0.0
+        """
+        name = self.names[i]
+        text = self.texts[i]
+        op = text[:len(name)].partition(".")[2]
+        pos = text.find(query)
+        if pos < 0:
+            base = 90 * fuzzy
+        elif op == query or text[:len(name)] == query:
+            base = 400
+        elif pos == 0 or op.startswith(query):
+            base = 300
+        elif text[pos - 1] in " ._":
+            base = 200
+        else:
+            base = 100
+        return base - max(pos, 0) * 0.1 - len(name) * 0.01
+
+    def search(self, query: str, limit: int = SEARCH_LIMIT) -> list[str]:
+        """ query に一致するオペレーター名を、評価値の高い順に最大 limit 件返す
+
+        query (str): 入力
+        limit (int): 返す最大の件数
+        """
+        query = query.strip().lower()
+        if len(query) <= TRIE_DEPTH and TOKEN_SEPARATOR.search(query) is None:
+            node = self.trie
+            for c in query:
+                node = node.children.get(c)
+                if node is None:
+                    return []
+            top = node.top if node.top is not None else self.rank(query, node)
+            return top[:limit]
+
+        matches = self.candidates(query)
+        best = heapq.nlargest(limit, matches, key=lambda i: self.score(i, query, matches[i]))
+        return [self.names[i] for i in best]
+
+
+# 一覧の作成を1回の timer 呼び出しで進める時間 (秒) と、次の呼び出しまでの間隔 (秒)
+CATALOG_FRAME_BUDGET = 0.004
+CATALOG_INTERVAL = 0.01
+
+
+class OperatorCatalog:
+    """ 'module.op' 形式のオペレーター名の一覧を、検索のたびに作り直さずに保持する
+    登録されているオペレーターが変わった可能性があるとき (アドオンの有効/無効の切り替え、invalidate()) のみ作り直す
+    作り直しは bpy.app.timers から step() を呼び、CATALOG_FRAME_BUDGET 秒ずつ少しずつ進める
+
+    names (list[str]): 'module.op' 形式のオペレーター名の一覧. 作成中は作成済みの分のみ
+    index (SearchIndex): オペレーター名とラベルの検索のための索引. 作成中は作成済みの分のみ
+    version (int): invalidate() のたびに増える番号
+    signature (tuple[tuple[str, ...], int]): 一覧の作成時の (有効なアドオンの一覧, version)
+    building (bool): 一覧を作成中か
+    modules (list[str]): 作成中、まだ走査していない bpy.ops のサブモジュール名 (逆順)
+    queue (list[str]): 作成中、走査中のサブモジュールのまだ追加していないオペレーター名 (逆順)
+    submodule: 走査中の bpy.ops のサブモジュール
+    total_modules (int): bpy.ops のサブモジュールの数
+    ranking (list[tuple[str, TrieNode]] | None): 全項目の追加後、まだ検索結果を求めていないトライ木の節
+    """
+    def __init__(self):
+        self.names: list[str] = []
+        self.index = SearchIndex()
+        self.version = 0
+        self.signature: tuple[tuple[str, ...], int] = ((), -1)
+        self.building = False
+        self.modules: list[str] = []
+        self.queue: list[str] = []
+        self.submodule = None
+        self.total_modules = 0
+        self.ranking: Optional[list[tuple[str, TrieNode]]] = None
+
+    def invalidate(self, *_args) -> None:
+        """ 次の ensure() で一覧を作り直す
+        """
+        self.version += 1
+
+    def ensure(self, context: Context) -> list[str]:
+        """ 登録されているオペレーターが変わっていれば一覧の作成を始め、現在の一覧を返す
+
+        context (bpy.types.Context): context
+        """
+        signature = (tuple(context.preferences.addons.keys()), self.version)
+        if signature != self.signature:
+            self.start()
+            self.signature = signature
+        return self.names
+
+    def start(self) -> None:
+        """ 一覧と索引を空にして、bpy.app.timers による作成を始める
+        """
+        self.names = []
+        self.index = SearchIndex()
+        self.modules = list(reversed(dir(bpy.ops)))
+        self.queue = []
+        self.submodule = None
+        self.total_modules = len(self.modules)
+        self.ranking = None
+        self.building = True
+        if not bpy.app.timers.is_registered(build_catalog_step):
+            bpy.app.timers.register(build_catalog_step, persistent=True)
+
+    def step(self) -> Optional[float]:
+        """ CATALOG_FRAME_BUDGET 秒だけ一覧の作成を進める. 全項目を追加した後、短い入力の検索結果を求める
+        bpy.app.timers から呼ばれるため、次の呼び出しまでの秒数を返し、作成が終われば None を返す
+        """
+        clock = time.perf_counter
+        deadline = clock() + CATALOG_FRAME_BUDGET
+        while clock() < deadline:
+            if self.ranking is not None:
+                if not self.ranking:
+                    self.ranking = None
+                    self.building = False
+                    return None
+                self.index.rank(*self.ranking.pop())
+                continue
+            if not self.queue:
+                if not self.modules:
+                    self.submodule = None
+                    self.ranking = self.index.prefix_nodes()
+                    continue
+                mod = self.modules.pop()
+                self.submodule = getattr(bpy.ops, mod)
+                self.queue = [mod + '.' + op for op in reversed(dir(self.submodule))]
+                continue
+            name = self.queue.pop()
+            try:
+                label = getattr(self.submodule, name.partition('.')[2]).get_rna_type().name
+            except (AttributeError, KeyError, RuntimeError):
+                label = ""
+            self.names.append(name)
+            self.index.add(name, label)
+        return CATALOG_INTERVAL
+
+    def progress(self) -> float:
+        """ 一覧の作成の進み具合 (0.0 - 1.0) を、走査済みのサブモジュールの割合で返す
+        """
+        if not self.building or self.total_modules == 0:
+            return 1.0
+        return (self.total_modules - len(self.modules) - (1 if self.queue else 0)) / self.total_modules
+
+    def progress_text(self) -> str:
+        """ 作成中であることを示す文字列を返す. 'module.op' 形式にならないため、選ばれても無視される
+        """
+        return f"[indexing {self.progress() * 100:.0f}%: {len(self.names)} operators]"
+
+    def search(self, context: Context, query: str) -> list[str]:
+        """ query に一致するオペレーター名を返す. 空の場合は一覧をそのまま返す
+        作成中は作成済みの分から探し、先頭に進み具合を示す文字列を加える
+
+        context (bpy.types.Context): context
+        query (str): 入力
+        """
+        names = self.ensure(context)
+        found = names if query.strip() == "" else self.index.search(query)
+        if self.building:
+            return [self.progress_text()] + found
+        return found
+
+
+operator_catalog = OperatorCatalog()
+
+
+def build_catalog_step():
+    return operator_catalog.step()
+
+
 def prop_operator_search_items(self, context, edit_tect):
-    items = []
-    for mod in dir(bpy.ops):
-        for op in dir(getattr(bpy.ops, mod)):
-            name = mod + '.' + op
-            items.append(name)
-    return items
+    return operator_catalog.search(context, edit_tect)
+
+
+class OperatorResolver:
+    """ 'module.op' 形式の idname から bpy.ops の呼び出し可能オブジェクトを引くためのキャッシュ
+
+    cache (dict[str, Any]): {idname: オペレーター | None}. None は存在しない idname を表す
+    signature (tuple[str, ...]): キャッシュ作成時に有効だったアドオンの一覧
+    """
+    def __init__(self):
+        self.cache: dict[str, Any] = {}
+        self.signature: tuple[str, ...] = ()
+
+    def invalidate(self, *_args) -> None:
+        """ キャッシュを破棄する
+        """
+        self.cache.clear()
+
+    def validate(self, context: Context) -> None:
+        """ 有効なアドオンの構成が変わっていれば (= オペレーターが増減した可能性があれば) キャッシュを破棄する
+
+        context (bpy.types.Context): context
+        """
+        signature = tuple(context.preferences.addons.keys())
+        if signature != self.signature:
+            self.cache.clear()
+            self.signature = signature
+
+    def resolve(self, name: str):
+        """ idname に対応する bpy.ops のオペレーターを返す. 存在しない場合は None
+
+        name (str): 'module.op' 形式の idname
+        """
+        if name in self.cache:
+            return self.cache[name]
+        split = name.split('.')
+        op = None
+        if len(split) == 2:
+            m, o = split
+            if m in dir(bpy.ops):
+                mod = getattr(bpy.ops, m)
+                if o in dir(mod):
+                    op = getattr(mod, o)
+        self.cache[name] = op
+        return op
+
+
+operator_resolver = OperatorResolver()
 
 
 def get_operator(name):
-    split = name.split('.')
-    op = None
-    if len(split) == 2:
-        m, o = split
-        if m in dir(bpy.ops):
-            mod = getattr(bpy.ops, m)
-            if o in dir(mod):
-                op = getattr(mod, o)
-    return op
+    operator_resolver.validate(bpy.context)
+    return operator_resolver.resolve(name)
 
 
 def prop_from_struct(prop):
@@ -133,7 +504,7 @@ def prop_from_struct(prop):
         return create_int_prop(prop)
     elif prop.type == "FLOAT":
         return create_float_prop(prop)
-    elif prop.type == "STEING":
+    elif prop.type == "STRING":
         return create_string_prop(prop)
     elif prop.type == "ENUM":
         return create_enum_prop(prop)
@@ -141,17 +512,201 @@ def prop_from_struct(prop):
         return None
 
 
+class SchemaCache:
+    """ オペレーターのプロパティを prop_from_struct() で bpy.props の定義に変換した結果を保持する
+    同じオペレーターを何度選んでも、ファイルの読み込み時に多くの項目を復元しても、変換は1回で済む
+    有効なアドオンの構成が変わったとき (= オペレーターが登録し直された可能性があるとき) に破棄する
+
+    schemas (dict[tuple[str, tuple[int, ...]], list[tuple[str, Any]]]):
+        {(idname, bpy.app.version): [(プロパティの identifier, bpy.props の定義)]}
+    signature (tuple[str, ...]): キャッシュ作成時に有効だったアドオンの一覧
+    version (int): キャッシュを破棄するたびに増える番号. 生成済みの PropertyGroup が最新かの判定に使う
+    """
+    def __init__(self):
+        self.schemas: dict[tuple[str, tuple[int, ...]], list[tuple[str, Any]]] = {}
+        self.signature: tuple[str, ...] = ()
+        self.version = 0
+
+    def validate(self, context: Context) -> None:
+        """ 有効なアドオンの構成が変わっていればキャッシュを破棄する
+
+        context (bpy.types.Context): context
+        """
+        signature = tuple(context.preferences.addons.keys())
+        if signature != self.signature:
+            self.schemas.clear()
+            self.signature = signature
+            self.version += 1
+
+    def get(self, context: Context, name: str) -> Optional[list[tuple[str, Any]]]:
+        """ オペレーターのプロパティの定義の一覧を返す. オペレーターが存在しない場合は None
+        bpy.props で表せないプロパティ (POINTER, COLLECTION) は含まない
+
+        context (bpy.types.Context): context
+        name (str): 'module.op' 形式の idname
+        """
+        self.validate(context)
+        key = (name, bpy.app.version)
+        schema = self.schemas.get(key)
+        if schema is None:
+            op = get_operator(name)
+            if op == None:
+                return None
+            schema = []
+            for prop in op.get_rna_type().properties:
+                if prop.identifier == 'rna_type':
+                    continue
+                bl_prop = prop_from_struct(prop)
+                if bl_prop is not None:
+                    schema.append((prop.identifier, bl_prop))
+            self.schemas[key] = schema
+        return schema
+
+
+schema_cache = SchemaCache()
+
+
+class OperatorPropsRegistry:
+    """ オペレーターごとに生成した PropertyGroup のクラスを管理する
+    クラスは idname ごとに1度だけ生成・登録し、ExperimentOp には PointerProperty で取り付ける
+    どの項目からも使われなくなったクラスは、取り外して登録を解除する
+    クラスは項目の初回の描画時に用意し、作成時からスキーマが変わっていなければ作り直さない
+    描画中はクラスの登録や setattr ができないため、描画と load_post からは request() で予約し、
+    bpy.app.timers から呼ばれる sync() でまとめて用意・整理してから再描画する
+
+    classes (dict[str, tuple[type, list[str], int]]):
+        {idname: (PropertyGroup のクラス, 描画するプロパティ名の一覧, 作成時の SchemaCache.version)}
+    pending (set[str]): 次の sync() で用意する idname
+    stale (bool): ファイルの読み込み後、使われなくなったクラスの整理が済んでいないか
+    """
+    def __init__(self):
+        self.classes: dict[str, tuple[type, list[str], int]] = {}
+        self.pending: set[str] = set()
+        self.stale = False
+
+    @staticmethod
+    def attr_name(name: str) -> str:
+        """ ExperimentOp に取り付ける PointerProperty の名前を返す
+
+        name (str): 'module.op' 形式の idname
+        """
+        return "props__" + name.replace(".", "__")
+
+    def ensure(self, context: Context, name: str) -> bool:
+        """ オペレーターの PropertyGroup のクラスが無ければ生成して取り付ける. オペレーターが存在しない場合は False
+
+        context (bpy.types.Context): context
+        name (str): 'module.op' 形式の idname
+        """
+        schema_cache.validate(context)
+        found = self.classes.get(name)
+        if found is not None:
+            if found[2] == schema_cache.version:
+                return True
+            self.release(name)
+        schema = schema_cache.get(context, name)
+        if schema is None:
+            return False
+        t_start = time.perf_counter()
+        cls = type(
+            "DPS_PG_" + name.replace(".", "__"), (bpy.types.PropertyGroup,), {"__annotations__": dict(schema)}
+        )
+        bpy.utils.register_class(cls)
+        setattr(ExperimentOp, self.attr_name(name), PointerProperty(type=cls))
+        self.classes[name] = (cls, [identifier for identifier, _ in schema], schema_cache.version)
+        restore_stats["restored"] += 1
+        restore_stats["restore_ms"] += (time.perf_counter() - t_start) * 1000
+        return True
+
+    def is_current(self, context: Context, name: str) -> bool:
+        """ オペレーターのクラスが作成済みで、作成時からスキーマが変わっていないか. 描画中にも呼べるよう、RNA には書き込まない
+
+        context (bpy.types.Context): context
+        name (str): 'module.op' 形式の idname
+        """
+        schema_cache.validate(context)
+        found = self.classes.get(name)
+        return found is not None and found[2] == schema_cache.version
+
+    def request(self, name: str = "") -> None:
+        """ 次の sync() でのクラスの用意を予約する. 描画中にも呼べる
+
+        name (str): 'module.op' 形式の idname. 空の場合は整理だけを予約する. デフォルト ""
+        """
+        if name != "":
+            self.pending.add(name)
+        if not bpy.app.timers.is_registered(sync_props_registry):
+            bpy.app.timers.register(sync_props_registry, first_interval=0.0, persistent=True)
+
+    def sync(self, context: Context) -> None:
+        """ 予約されたクラスを用意し、ファイルの読み込み後なら使われなくなったクラスを整理する
+        クラスが変わった場合のみ設定画面を再描画する. 存在しないオペレーターの予約で再描画が繰り返されないようにするため
+
+        context (bpy.types.Context): context
+        """
+        prefs = context.preferences.addons[__name__].preferences
+        before = dict(self.classes)
+        if self.stale:
+            self.prune({item.name for item in prefs.operators})
+            self.stale = False
+        pending, self.pending = self.pending, set()
+        for name in pending:
+            self.ensure(context, name)
+        if self.classes == before:
+            return
+        for window in context.window_manager.windows:
+            for area in window.screen.areas:
+                if area.type == 'PREFERENCES':
+                    area.tag_redraw()
+
+    def fields(self, name: str) -> list[str]:
+        """ オペレーターの PropertyGroup で描画するプロパティ名の一覧を返す. クラスが無い場合は空のリスト
+
+        name (str): 'module.op' 形式の idname
+        """
+        found = self.classes.get(name)
+        return found[1] if found else []
+
+    def prune(self, in_use: set[str]) -> None:
+        """ in_use に含まれないオペレーターのクラスを取り外して登録を解除する
+
+        in_use (set[str]): いずれかの項目で使われている idname
+        """
+        for name in [name for name in self.classes if name not in in_use]:
+            self.release(name)
+
+    def release(self, name: str) -> None:
+        """ オペレーターのクラスを取り外して登録を解除する
+
+        name (str): 'module.op' 形式の idname
+        """
+        cls, _fields, _version = self.classes.pop(name)
+        delattr(ExperimentOp, self.attr_name(name))
+        bpy.utils.unregister_class(cls)
+
+    def clear(self) -> None:
+        """ すべてのクラスを取り外して登録を解除する
+        """
+        for name in list(self.classes):
+            self.release(name)
+
+
+props_registry = OperatorPropsRegistry()
+
+
+def sync_props_registry():
+    props_registry.sync(bpy.context)
+    return None
+
+# 復元にかかった時間の記録. handler_ms は直前の load_post ハンドラー、restored と restore_ms は起動からの累計
+restore_stats: dict[str, float] = {"handler_ms": 0.0, "restored": 0, "restore_ms": 0.0}
+
+
 def dynamic_prop_setter(self, context):
-    op = get_operator(self.name)
-    if op == None:
-        return
-    bl_rna = op.get_rna_type()
-    props = [p for p in bl_rna.properties if p.identifier != 'rna_type']
-    for prop in props:
-        base_name = self.name.replace(".", "__")
-        name =  f"{base_name}__{prop.identifier}"
-        bl_prop = prop_from_struct(prop)
-        setattr(ExperimentOp, name, bl_prop)
+    prefs = context.preferences.addons[__name__].preferences
+    if self.name != "":
+        props_registry.ensure(context, self.name)
+    props_registry.prune({item.name for item in prefs.operators})
 
 
 # ----- property class --------------
@@ -160,6 +715,16 @@ class ExperimentOp(bpy.types.PropertyGroup):
                         update=dynamic_prop_setter, search=prop_operator_search_items )
     show_expanded: BoolProperty( name='Show Details', default=True)
 
+    def props(self, context:Context):
+        """ 選ばれたオペレーターのプロパティを持つ PropertyGroup を返す. 用意ができていない場合は None
+        描画中に呼ばれるため、クラスの用意は予約するだけにする
+        """
+        if self.name == "":
+            return None
+        if not props_registry.is_current(context, self.name):
+            props_registry.request(self.name)
+        return getattr(self, props_registry.attr_name(self.name), None)
+
     def draw(self, context:Context, layout:UILayout):
         base = layout.column()
         row_1 = base.row()
@@ -171,9 +736,10 @@ class ExperimentOp(bpy.types.PropertyGroup):
 
         if self.show_expanded:
             indented = indented_layout(context, base, 1).box()
-            if self.name != "":
-                for name in [p for p in dir(self) if p.startswith(self.name.replace(".", "__")) ]:
-                    indented.prop(self, name)
+            group = self.props(context)
+            if group is not None:
+                for name in props_registry.fields(self.name):
+                    indented.prop(group, name)
 
 
 # ----- preference --------------------
@@ -185,10 +751,13 @@ class AddonPrefs(bpy.types.AddonPreferences):
         base: UILayout = self.layout.column()
         for op in self.operators:
             op.draw(context, base)
-
-    def prop_restore(self):
-        for item in self.operators:
-            dynamic_prop_setter(item, bpy.context)
+        base.label(
+            text=f"load_post: {restore_stats['handler_ms']:.2f} ms,"
+                 f" restored {restore_stats['restored']} ({restore_stats['restore_ms']:.1f} ms)",
+            icon='TIME'
+        )
+        if operator_catalog.building:
+            base.label(text=operator_catalog.progress_text(), icon='SORTTIME')
 
 #---------------------------------------------------
 
@@ -199,8 +768,14 @@ classes = [
 
 @bpy.app.handlers.persistent
 def load_handler(dummy):
-    prefs = bpy.context.preferences.addons[__name__].preferences
-    prefs.prop_restore()		
+    # 項目の復元は初回の描画時まで遅らせ、ここでは使われなくなったクラスの整理を予約するだけにする
+    t_start = time.perf_counter()
+    operator_resolver.invalidate()
+    operator_catalog.invalidate()
+    props_registry.stale = True
+    props_registry.request()
+    restore_stats["handler_ms"] = (time.perf_counter() - t_start) * 1000
+    print(f"{__name__}: load_post handler {restore_stats['handler_ms']:.3f} ms")
 
 
 def register():
@@ -212,9 +787,18 @@ def register():
         for i in range(3):
             items.add()
     bpy.app.handlers.load_post.append(load_handler)
+    operator_catalog.ensure(bpy.context)
         
 
 def unregister():
+    if bpy.app.timers.is_registered(build_catalog_step):
+        bpy.app.timers.unregister(build_catalog_step)
+    operator_catalog.building = False
+    operator_catalog.invalidate()
+    if bpy.app.timers.is_registered(sync_props_registry):
+        bpy.app.timers.unregister(sync_props_registry)
+    props_registry.pending.clear()
+    props_registry.clear()
     for cls in classes:
         bpy.utils.unregister_class(cls)
     bpy.app.handlers.load_post.remove(load_handler)